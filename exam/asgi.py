@@ -12,5 +12,14 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exam.settings')
+os.environ.setdefault('EXAM_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
+
+from examapp.assets import StaticFilesASGI  # noqa: E402
+from examapp.autocomplete import warm_up  # noqa: E402
+
+# Собранная статика (collectstatic) отдается до Django и без DEBUG
+application = StaticFilesASGI(application)
+
+warm_up()
@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'examapp.middleware.PerformanceMiddleware',
+    'examapp.middleware.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,11 +73,18 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'exam.wsgi.application'
+ASGI_APPLICATION = 'exam.asgi.application'
+
+# Асинхронные представления каталога; включаются в exam/asgi.py
+ASYNC_VIEWS = os.environ.get('EXAM_ASYNC_VIEWS') == '1'
 
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Постоянные соединения с проверкой перед повторным использованием. Под
+# ASGI соединения не переживают запрос, поэтому там нужен внешний пул
+# (например, PgBouncer)
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -83,10 +92,24 @@ DATABASES = {
         'USER': 'postgres',
         'PASSWORD': '1',
         'HOST': 'localhost',
-        'PORT': '5432'
+        'PORT': '5432',
+        'CONN_MAX_AGE': 0 if ASYNC_VIEWS else int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Реплика для чтения каталога. Локально ее роль может играть вторая база
+# на том же сервере (DB_REPLICA_NAME)
+if os.environ.get('DB_REPLICA_HOST') or os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+    }
+
+DATABASE_ROUTERS = ['examapp.routers.ReplicaRouter']
+
 PASSWORD_HASHERS = [
     "django.contrib.auth.hashers.PBKDF2PasswordHasher",
 ]
@@ -129,10 +152,108 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
+# Сборка статики: manage.py collectstatic минифицирует CSS/JS, добавляет к
+# именам хэш содержимого и пишет сжатые варианты. В production статику
+# отдает examapp.assets.StaticFiles* из exam/wsgi.py и exam/asgi.py
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'examapp.assets.BuiltStaticStorage',
+    },
+}
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Кэш. Версии каталога и справочников, группы пользователей и сессии
+# хранятся здесь, и кэш должен быть общим для всех воркеров: в production
+# задается REDIS_URL, иначе используется файловый кэш на этой машине.
+# Кэш в памяти процесса (LocMemCache) не подходит: воркер не видел бы
+# записей других и отдавал бы устаревшие страницы и 304
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+    # Сессии целиком в Redis, без записи в БД
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / 'cache'),
+        }
+    }
+    # Файловый кэш очищается вместе с каталогом, поэтому сессии
+    # дублируются в БД, но читаются из кэша
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Флеш-сообщения (приветствие, выход и т.д.) хранятся в подписанном cookie,
+# а не в сессии
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Постраничный вывод каталога в manager/admin
+PRODUCTS_PAGE_SIZE = 50
+
+# Количество подсказок автодополнения в /search/
+AUTOCOMPLETE_LIMIT = 10
+
+# Превышение бюджета запросов (@query_budget) - ошибка в режиме разработки
+# и предупреждение в логе в production
+QUERY_BUDGET_STRICT = DEBUG
+
+# Число записей в кэше отфильтрованных списков товаров (на процесс)
+LISTING_CACHE_SIZE = 512
+
+# Как часто индекс автодополнения сверяет свою версию с версией каталога, с
+AUTOCOMPLETE_REFRESH_INTERVAL = 5
+
+# Миниатюры изображений товаров: каталог внутри MEDIA_ROOT, размеры
+# (ширина, высота) по возрастанию, число процессов генерации и заглушка
+THUMBNAIL_DIR = 'derivatives'
+THUMBNAIL_SIZES = ((200, 300), (400, 600))
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_PLACEHOLDER = 'stub.jpg'
+
+# Размер порции строк серверного курсора при экспорте каталога
+EXPORT_CHUNK_SIZE = 2000
+
+# Время хранения списка групп пользователя в кэше, с
+USER_GROUPS_CACHE_TIMEOUT = 3600
+
+# Время хранения отрисованных карточек товаров в кэше, с
+PRODUCT_CARD_CACHE_TIMEOUT = 24 * 3600
+
+# Метрики производительности: запросы дольше порога пишутся в лог вместе с
+# самыми медленными SQL. /metrics/ доступен персоналу и сборщику метрик
+# с заголовком Authorization: Bearer <METRICS_TOKEN>. Адреса из
+# METRICS_ALLOWED_IPS пускаются без токена - только если сервер доступен
+# напрямую, без прокси на той же машине
+SLOW_REQUEST_THRESHOLD_MS = 500
+SLOW_REQUEST_LOG_QUERIES = 5
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = []
+
+# Число последних дат доставки на панели заказов
+ORDERS_DASHBOARD_DAYS = 60
+
+# Статус, в который переводятся заказы при выдаче в пункте выдачи, и
+# наибольшее число кодов в одном запросе на выдачу
+ORDER_ISSUED_STATUS = 'Выдан'
+PICKUP_BATCH_LIMIT = 500
+
+# Чтение каталога с реплики (если она настроена) и время, на которое
+# клиент после записи закрепляется за основной базой, с
+REPLICA_READS = True
+REPLICA_PIN_SECONDS = 10
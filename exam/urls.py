@@ -19,16 +19,25 @@ from django.contrib import admin
 from django.urls import path
 
 from exam import settings
-from examapp import views
+from examapp import async_views, views
+
+# Под ASGI каталог и поиск обслуживают асинхронные представления
+catalog_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('home/', views.home_view,  name="home"),
+    path('home/', catalog_views.home_view,  name="home"),
     path('client/', views.client, name='client'),
-    path('manager/', views.manager, name='manager'),
-    path('admin-panel/', views.admin, name='admin'),
+    path('manager/', catalog_views.manager, name='manager'),
+    path('admin-panel/', catalog_views.admin, name='admin'),
     path('', views.login_view, name="login"),
     path('logout/', views.logout_view, name="logout"),
-    path('search/', views.search_view, name="search"),
+    path('search/', catalog_views.search_view, name="search"),
+    path('export/', views.export_products, name="export_products"),
+    path('metrics/', views.metrics_view, name="metrics"),
+    path('orders/dashboard/', views.orders_dashboard, name="orders_dashboard"),
+    path('pvz/<int:pvz_id>/orders/', views.pvz_order_lookup, name="pvz_order_lookup"),
+    path('pvz/<int:pvz_id>/issue/', views.pvz_issue_orders, name="pvz_issue_orders"),
     path('/<int:product_id>/', views.upload_product_image, name='upload_product_image'),
 ]
 if settings.DEBUG:
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exam.settings')
 
 application = get_wsgi_application()
+
+from examapp.assets import StaticFilesWSGI  # noqa: E402
+from examapp.autocomplete import warm_up  # noqa: E402
+
+# Собранная статика (collectstatic) отдается до Django и без DEBUG
+application = StaticFilesWSGI(application)
+
+warm_up()
@@ -0,0 +1,278 @@
+import gzip
+import mimetypes
+import os
+import re
+from urllib.parse import unquote, urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+# Сжатые заранее варианты в порядке предпочтения: (кодировка, расширение)
+ENCODINGS = [('gzip', '.gz')]
+if brotli is not None:
+    ENCODINGS.insert(0, ('br', '.br'))
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map')
+# Мелкие файлы не сжимаются: выигрыш меньше заголовков
+COMPRESS_MIN_SIZE = 512
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Файлы под исходными именами могут поменяться при следующей сборке
+DEFAULT_CACHE_CONTROL = 'public, max-age=60'
+BLOCK_SIZE = 64 * 1024
+
+CSS_COMMENT_RE = re.compile(r'/\*(?!!).*?\*/', re.S)
+CSS_SPACE_RE = re.compile(r'\s+')
+CSS_PUNCTUATION_RE = re.compile(r'\s*([{};,])\s*')
+
+
+def minify_css(text):
+    # Консервативно: комментарии (кроме /*! лицензий */), пробелы и пробелы
+    # вокруг { } ; , - без разбора селекторов
+    text = CSS_COMMENT_RE.sub('', text)
+    text = CSS_SPACE_RE.sub(' ', text)
+    text = CSS_PUNCTUATION_RE.sub(r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify(name, content):
+    """
+    Минифицированное содержимое CSS/JS-файла или None, если минифицировать
+    нечем. Если рядом с исходником лежит готовая .min-версия (как в UIkit),
+    берется она.
+    """
+    base, ext = os.path.splitext(name)
+    if ext not in ('.css', '.js') or base.endswith('.min'):
+        return None
+    source = getattr(content, 'name', None)
+    if source and os.path.isabs(source):
+        sibling = os.path.splitext(source)[0] + '.min' + ext
+        if os.path.exists(sibling):
+            with open(sibling, 'rb') as f:
+                return f.read()
+    if ext == '.css':
+        return minify_css(content.read().decode()).encode()
+    if rjsmin is not None:
+        return rjsmin.jsmin(content.read().decode()).encode()
+    return None
+
+
+def compress_file(path):
+    """
+    Запись .gz (и .br, если установлен brotli) рядом с файлом. Вариант
+    сохраняется, только если он заметно меньше исходника.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    written = []
+    for encoding, suffix in ENCODINGS:
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=11)
+        else:
+            # mtime=0: одинаковый результат при повторной сборке
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(encoding)
+    return written
+
+
+class BuiltStaticStorage(ManifestStaticFilesStorage):
+    """
+    Хранилище статики для collectstatic: CSS/JS минифицируются, к именам
+    добавляется хэш содержимого (manifest staticfiles.json), для текстовых
+    файлов заранее пишутся сжатые варианты, которые отдает StaticFiles.
+    Пока сборка не выполнена, {% static %} возвращает исходные имена.
+    """
+
+    def save(self, name, content, max_length=None):
+        minified = minify(name, content)
+        if minified is not None:
+            content = ContentFile(minified)
+        return super().save(name, content, max_length)
+
+    def stored_name(self, name):
+        # Без манифеста или для файла вне его (например, каталога) - исходное
+        # имя, без чтения файлов на каждом вызове {% static %}
+        hashed = self.hashed_files.get(self.hash_key(self.clean_name(name)))
+        return hashed if hashed is not None else name
+
+    def post_process(self, paths, dry_run=False, **options):
+        # Копии с хэшем строятся из уже собранных (минифицированных) файлов,
+        # а не из исходников
+        paths = {name: (self, name) for name in paths}
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.size(name) >= COMPRESS_MIN_SIZE:
+                compress_file(self.path(name))
+
+
+class StaticFile:
+    def __init__(self, path, content_type, cache_control, variants):
+        self.path = path
+        self.content_type = content_type
+        self.cache_control = cache_control
+        # {кодировка: (путь, размер)}, включая исходник под ключом None
+        self.variants = variants
+
+    def choose(self, accept_encoding):
+        accepted = {part.split(';')[0].strip() for part in accept_encoding.split(',')}
+        for encoding, _ in ENCODINGS:
+            if encoding in self.variants and encoding in accepted:
+                return encoding
+        return None
+
+    def headers(self, encoding):
+        headers = [
+            ('Content-Type', self.content_type),
+            ('Content-Length', str(self.variants[encoding][1])),
+            ('Cache-Control', self.cache_control),
+        ]
+        if len(self.variants) > 1:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if encoding is not None:
+            headers.append(('Content-Encoding', encoding))
+        return headers
+
+
+class StaticFiles:
+    """
+    Таблица собранной статики (STATIC_ROOT): URL -> файл и его сжатые
+    варианты. Строится один раз при первом запросе; после новой сборки
+    процессы нужно перезапустить.
+    """
+
+    def __init__(self, root=None, url=None):
+        self.root = str(root or settings.STATIC_ROOT or '')
+        self.prefix = urlsplit(url or settings.STATIC_URL).path
+        if not self.prefix.startswith('/'):
+            self.prefix = '/' + self.prefix
+        self._files = None
+
+    def scan(self):
+        files = {}
+        if not self.root or not os.path.isdir(self.root):
+            return files
+        storage = BuiltStaticStorage(location=self.root)
+        hashed = set(storage.hashed_files.values())
+        suffixes = {suffix: encoding for encoding, suffix in ENCODINGS}
+        for directory, _, names in os.walk(self.root):
+            for filename in names:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if os.path.splitext(path)[1] in ('.gz', '.br') or name == storage.manifest_name:
+                    continue
+                variants = {None: (path, os.path.getsize(path))}
+                for suffix, encoding in suffixes.items():
+                    if os.path.exists(path + suffix):
+                        variants[encoding] = (path + suffix, os.path.getsize(path + suffix))
+                content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                if content_type.startswith('text/') or content_type == 'application/javascript':
+                    content_type += '; charset=utf-8'
+                cache_control = IMMUTABLE_CACHE_CONTROL if name in hashed else DEFAULT_CACHE_CONTROL
+                files[self.prefix + name] = StaticFile(path, content_type, cache_control, variants)
+        return files
+
+    def find(self, path, method):
+        if method not in ('GET', 'HEAD') or not path.startswith(self.prefix):
+            return None
+        if self._files is None:
+            self._files = self.scan()
+        return self._files.get(unquote(path))
+
+
+class StaticFilesWSGI:
+    """
+    Раздача собранной статики перед Django в WSGI-сервере (работает и без
+    DEBUG). Файл передается через wsgi.file_wrapper: gunicorn и uWSGI
+    отправляют его вызовом sendfile без копирования в процесс.
+    """
+
+    def __init__(self, application, static_files=None):
+        self.application = application
+        self.static_files = static_files or StaticFiles()
+
+    def __call__(self, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        static_file = self.static_files.find(environ.get('PATH_INFO', ''), method)
+        if static_file is None:
+            return self.application(environ, start_response)
+        encoding = static_file.choose(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        start_response('200 OK', static_file.headers(encoding))
+        if method == 'HEAD':
+            return []
+        f = open(static_file.variants[encoding][0], 'rb')
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            return file_wrapper(f, BLOCK_SIZE)
+        return _iter_file(f)
+
+
+def _iter_file(f):
+    with f:
+        while chunk := f.read(BLOCK_SIZE):
+            yield chunk
+
+
+class StaticFilesASGI:
+    """
+    То же для ASGI. Если сервер поддерживает расширение
+    http.response.pathsend или http.response.zerocopysend, файл отправляет
+    сам сервер, иначе он читается частями в потоке.
+    """
+
+    def __init__(self, application, static_files=None):
+        self.application = application
+        self.static_files = static_files or StaticFiles()
+
+    async def __call__(self, scope, receive, send):
+        static_file = None
+        if scope['type'] == 'http':
+            static_file = self.static_files.find(scope['path'], scope['method'])
+        if static_file is None:
+            return await self.application(scope, receive, send)
+
+        accept_encoding = ''
+        for key, value in scope['headers']:
+            if key == b'accept-encoding':
+                accept_encoding = value.decode('latin1')
+        encoding = static_file.choose(accept_encoding)
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(k.lower().encode('latin1'), v.encode('latin1'))
+                        for k, v in static_file.headers(encoding)],
+        })
+        if scope['method'] == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        path = static_file.variants[encoding][0]
+        extensions = scope.get('extensions') or {}
+        if 'http.response.pathsend' in extensions:
+            await send({'type': 'http.response.pathsend', 'path': path})
+        elif 'http.response.zerocopysend' in extensions:
+            with open(path, 'rb') as f:
+                await send({'type': 'http.response.zerocopysend', 'file': f})
+        else:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = await sync_to_async(f.read, thread_sensitive=False)(BLOCK_SIZE)
+                    more_body = len(chunk) == BLOCK_SIZE
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+                    if not more_body:
+                        break
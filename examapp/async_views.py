@@ -0,0 +1,107 @@
+import asyncio
+import functools
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import get_user
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.shortcuts import render
+
+from .autocomplete import get_product_index, product_index_version
+from .conditional import conditional_catalog
+from .dimensions import attach_dimensions
+from .models import Product
+from .querybudget import query_budget
+from .routers import replica_reads
+from .views import get_filter_params, listing_context, listing_loaders
+
+logger = logging.getLogger(__name__)
+
+# Асинхронные версии представлений каталога для развертывания под ASGI
+# (exam/asgi.py). Сессия и шаблоны в Django 4.2 синхронные,
+# поэтому они выполняются через sync_to_async.
+arender = sync_to_async(render)
+
+
+def async_login_required(view_func):
+    # login_required в Django 4.2 не поддерживает асинхронные представления
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await sync_to_async(get_user)(request)
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def _in_own_connection(func):
+    def run():
+        close_old_connections()
+        try:
+            return func()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def run_concurrently(*funcs):
+    """
+    Одновременное выполнение независимых запросов. Асинхронный ORM
+    Django 4.2 отправляет все запросы в один поток (thread_sensitive),
+    поэтому каждый запрос выполняется в отдельном потоке со своим
+    соединением.
+    """
+    return await asyncio.gather(*(sync_to_async(_in_own_connection(func), thread_sensitive=False)()
+                                  for func in funcs))
+
+
+@query_budget(5)
+@replica_reads
+@conditional_catalog
+async def home_view(request):
+    try:
+        products = await sync_to_async(attach_dimensions)([p async for p in Product.objects.all()])
+        return await arender(request, "home.html", {'products': products})
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке главной страницы: {str(e)}")
+        await sync_to_async(messages.error)(
+            request, "Произошла ошибка при загрузке данных. Пожалуйста, попробуйте позже.")
+        return await arender(request, "home.html", {'products': []})
+
+
+async def get_filtered_products(request):
+    filters = get_filter_params(request)
+    loaders = listing_loaders(filters, request.GET.get('cursor', ''))
+    return listing_context(filters, *await run_concurrently(*loaders))
+
+
+@query_budget(6)
+@replica_reads
+@async_login_required
+@conditional_catalog
+async def manager(request):
+    context = await get_filtered_products(request)
+    return await arender(request, "manager.html", context)
+
+
+@query_budget(6)
+@replica_reads
+@async_login_required
+@conditional_catalog
+async def admin(request):
+    context = await get_filtered_products(request)
+    return await arender(request, "admin.html", context)
+
+
+@query_budget(4)
+@replica_reads
+@conditional_catalog(csrf=False, get_version=product_index_version)
+async def search_view(request):
+    # Индекс строится из БД только при первом обращении
+    search_query = request.GET.get('q', request.GET.get('search', ''))
+    index = await sync_to_async(get_product_index)()
+    return JsonResponse(index.search(search_query, settings.AUTOCOMPLETE_LIMIT), safe=False)
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connection
+
+from .caching import get_catalog_version
+from .routers import primary_reads
+from .search import normalize
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixIndex:
+    """
+    Компактный индекс для автодополнения: отсортированный список ключей
+    (key, product_id) и поиск префикса двоичным поиском. Ключами служат
+    название товара с начала каждого слова и артикул, поэтому «дрель»
+    находит и «Аккумуляторная дрель».
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._entries = {}
+        self.built = False
+        self.version = None
+
+    @staticmethod
+    def _make_keys(product_id, name, article):
+        name = normalize(name)
+        keys = {normalize(article)}
+        keys.update(name[i:] for i in range(len(name)) if i == 0 or name[i - 1] == ' ')
+        return [(key, product_id) for key in keys if key]
+
+    def build(self, rows, version=None):
+        keys, entries = [], {}
+        for product_id, name, article in rows:
+            entries[product_id] = (name, article)
+            keys.extend(self._make_keys(product_id, name, article))
+        keys.sort()
+        with self._lock:
+            self._keys, self._entries = keys, entries
+            self.version = version
+            self.built = True
+
+    def advance_version(self, version):
+        # Индекс остается актуальным, только если версию увеличила именно
+        # примененная к нему запись; иначе изменения других воркеров
+        # подхватит перестроение
+        with self._lock:
+            if self.version is not None and version == self.version + 1:
+                self.version = version
+
+    def _remove(self, product_id):
+        entry = self._entries.pop(product_id, None)
+        if entry is None:
+            return
+        for key in self._make_keys(product_id, *entry):
+            i = bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+
+    def update(self, product_id, name, article):
+        with self._lock:
+            self._remove(product_id)
+            self._entries[product_id] = (name, article)
+            for key in self._make_keys(product_id, name, article):
+                insort(self._keys, key)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def search(self, prefix, limit):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        result, seen = [], set()
+        with self._lock:
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(result) < limit:
+                key, product_id = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                if product_id not in seen:
+                    seen.add(product_id)
+                    name, article = self._entries[product_id]
+                    result.append({'id': product_id, 'product': name, 'article': article})
+                i += 1
+        return result
+
+    def __len__(self):
+        return len(self._entries)
+
+
+product_index = PrefixIndex()
+_build_lock = threading.Lock()
+_last_check = 0.0
+_rebuilding = False
+
+
+def load_product_index():
+    from .models import Product
+
+    # Версия читается до выборки, чтобы изменения во время загрузки
+    # привели к повторному перестроению
+    version = get_catalog_version()
+    with primary_reads():
+        product_index.build(Product.objects.values_list('id', 'product', 'article').iterator(chunk_size=5000), version)
+    logger.info(f"Индекс автодополнения построен: {len(product_index)} товаров")
+
+
+def _rebuild_in_background():
+    global _rebuilding
+    try:
+        load_product_index()
+    except Exception as e:
+        logger.error(f"Не удалось перестроить индекс автодополнения: {str(e)}")
+    finally:
+        connection.close()
+        _rebuilding = False
+
+
+def get_product_index():
+    global _last_check, _rebuilding
+    if not product_index.built:
+        with _build_lock:
+            if not product_index.built:
+                load_product_index()
+                _last_check = time.monotonic()
+        return product_index
+
+    # Изменения из других воркеров: индекс перестраивается в фоне,
+    # а до окончания отвечает прежний
+    now = time.monotonic()
+    if now - _last_check >= settings.AUTOCOMPLETE_REFRESH_INTERVAL:
+        with _build_lock:
+            if now - _last_check >= settings.AUTOCOMPLETE_REFRESH_INTERVAL and not _rebuilding:
+                _last_check = now
+                if get_catalog_version() != product_index.version:
+                    _rebuilding = True
+                    threading.Thread(target=_rebuild_in_background, daemon=True).start()
+    return product_index
+
+
+def advance_product_index(*versions):
+    # Запись, уже внесенная в индекс (или не меняющая его), не требует
+    # перестроения индекса после увеличения версии каталога
+    if product_index.built:
+        for version in versions:
+            product_index.advance_version(version)
+
+
+def product_index_version():
+    # Индекс перестраивается в фоне и может отставать от версии каталога,
+    # поэтому ETag ответов автодополнения строится по версии индекса
+    return get_product_index().version
+
+
+def warm_up():
+    # Вызывается при старте воркера, чтобы первый запрос не строил индекс
+    try:
+        get_product_index()
+    except Exception as e:
+        logger.error(f"Не удалось построить индекс автодополнения: {str(e)}")
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .routers import primary_reads
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_MODIFIED_KEY = 'catalog:modified'
+DIMENSIONS_VERSION_KEY = 'dimensions:version'
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Начальное значение от времени, чтобы после вытеснения ключа из кэша
+        # номер версии не повторил один из уже использованных
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        get_version(key)
+        return cache.incr(key)
+
+
+def get_dimensions_version():
+    return get_version(DIMENSIONS_VERSION_KEY)
+
+
+def bump_dimensions_version():
+    # Второе увеличение после фиксации: воркер, успевший перечитать
+    # справочник до COMMIT, иначе хранил бы старые строки под новой версией
+    bump_version(DIMENSIONS_VERSION_KEY)
+    transaction.on_commit(lambda: bump_version(DIMENSIONS_VERSION_KEY))
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def get_catalog_state():
+    """
+    Версия каталога и время его последнего изменения за одно обращение
+    к кэшу (для условного GET).
+    """
+    values = cache.get_many([CATALOG_VERSION_KEY, CATALOG_MODIFIED_KEY])
+    version = values.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = get_catalog_version()
+    modified = values.get(CATALOG_MODIFIED_KEY)
+    if modified is None:
+        # Время изменения неизвестно: считаем, что каталог изменился сейчас
+        modified = time.time()
+        cache.add(CATALOG_MODIFIED_KEY, modified, None)
+    return version, modified
+
+
+def _increment_catalog_version():
+    version = bump_version(CATALOG_VERSION_KEY)
+    cache.set(CATALOG_MODIFIED_KEY, time.time(), None)
+    return version
+
+
+def bump_catalog_version(on_commit=None):
+    """
+    Увеличение версии каталога сразу и еще раз после фиксации транзакции:
+    читатель, успевший между записью и COMMIT закэшировать старые строки
+    под новой версией, иначе отдавал бы их до следующей записи.
+    on_commit получает номера версий до и после фиксации.
+    """
+    version = _increment_catalog_version()
+
+    def after_commit():
+        committed = _increment_catalog_version()
+        if on_commit is not None:
+            on_commit(version, committed)
+
+    transaction.on_commit(after_commit)
+    return version
+
+
+class VersionedLRUCache:
+    """
+    Ограниченный по размеру LRU-кэш в памяти процесса. Версия каталога
+    входит в ключ, поэтому после любой записи в каталог старые записи
+    просто перестают запрашиваться и вытесняются, явное удаление не нужно.
+    Значения вычисляются чтением с основной базы, а не с реплики.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        key = (get_catalog_version(), *key)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        with primary_reads():
+            value = compute()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
+
+
+listing_cache = VersionedLRUCache(settings.LISTING_CACHE_SIZE)
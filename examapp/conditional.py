@@ -0,0 +1,89 @@
+import functools
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .caching import get_catalog_state
+from .roles import get_user_role
+from .routers import replica_used
+
+
+def is_conditional(request):
+    # Страница с одноразовыми сообщениями отличается от закэшированной
+    return request.method in ('GET', 'HEAD') and CookieStorage.cookie_name not in request.COOKIES
+
+
+def catalog_validators(request, csrf=True, get_version=None):
+    """
+    ETag и Last-Modified страницы каталога. В ETag входят версия каталога,
+    путь, параметры запроса (фильтры, сортировка, курсор) и роль
+    пользователя, а для HTML-страниц еще и секрет CSRF: в страницу
+    встроен токен, который меняется при входе. get_version - версия
+    данных, из которых на самом деле строится ответ, если она может
+    отставать от версии каталога; Last-Modified тогда не выставляется.
+    """
+    if get_version is None:
+        version, modified = get_catalog_state()
+    else:
+        version, modified = get_version(), None
+    user = getattr(request, 'user', None)
+    role = get_user_role(user) if user is not None and user.is_authenticated else None
+    parts = [str(version), request.path, sorted(request.GET.lists()), str(role)]
+    if csrf:
+        # get_token заодно выставляет cookie, если его еще нет, поэтому
+        # ETag первого ответа совпадет с ETag следующего запроса
+        get_token(request)
+        parts.append(request.META['CSRF_COOKIE'])
+    etag = quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest())
+    return etag, None if modified is None else int(modified), role
+
+
+def _set_validators(response, etag, last_modified, role):
+    # Ответ, прочитанный с реплики, может отставать от версии каталога в
+    # ETag - такой ответ не должен потом подтверждаться через 304
+    if response.status_code == 304 or (response.status_code == 200 and not replica_used()):
+        response.headers.setdefault('ETag', etag)
+        if last_modified is not None:
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+        # Браузер и прокси хранят копию, но каждый раз сверяют ее с сервером
+        patch_cache_control(response, no_cache=True, private=role is not None)
+    return response
+
+
+def conditional_catalog(view_func=None, *, csrf=True, get_version=None):
+    """
+    Условный GET для страниц каталога: если у клиента актуальная копия,
+    ответ 304 отдается до запросов к товарам и отрисовки шаблона.
+    csrf=False - для ответов без форм (JSON), get_version - см.
+    catalog_validators.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @functools.wraps(view_func)
+            async def wrapper(request, *args, **kwargs):
+                if not is_conditional(request):
+                    return await view_func(request, *args, **kwargs)
+                etag, last_modified, role = await sync_to_async(catalog_validators)(request, csrf, get_version)
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                return _set_validators(response, etag, last_modified, role)
+        else:
+            @functools.wraps(view_func)
+            def wrapper(request, *args, **kwargs):
+                if not is_conditional(request):
+                    return view_func(request, *args, **kwargs)
+                etag, last_modified, role = catalog_validators(request, csrf, get_version)
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = view_func(request, *args, **kwargs)
+                return _set_validators(response, etag, last_modified, role)
+        return wrapper
+
+    if view_func is not None:
+        return decorator(view_func)
+    return decorator
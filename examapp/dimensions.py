@@ -0,0 +1,102 @@
+import functools
+import threading
+
+from django.db import models
+
+from .caching import get_dimensions_version
+from .models import CategoryProduct, Manufacturer, Producer, Pvz, StatusOrder
+from .routers import primary_reads
+
+# Справочники из одного поля name загружаются одним запросом UNION ALL
+NAMED_DIMENSIONS = (Producer, Manufacturer, CategoryProduct, StatusOrder)
+DIMENSIONS = NAMED_DIMENSIONS + (Pvz,)
+
+
+def _load_named():
+    querysets = [
+        model.objects.annotate(dimension=models.Value(i, output_field=models.IntegerField()))
+        .values_list('dimension', 'id', 'name').order_by()
+        for i, model in enumerate(NAMED_DIMENSIONS)
+    ]
+    union = querysets[0].union(*querysets[1:], all=True)
+    tables = {model: {} for model in NAMED_DIMENSIONS}
+    for dimension, pk, name in sorted(union, key=lambda row: row[1]):
+        model = NAMED_DIMENSIONS[dimension]
+        tables[model][pk] = model.from_db(union.db, ['id', 'name'], (pk, name))
+    return tables
+
+
+def _load(model):
+    # Таблицы хранятся под версией справочников основной базы
+    with primary_reads():
+        if model in NAMED_DIMENSIONS:
+            return _load_named()
+        return {model: {obj.id: obj for obj in model.objects.order_by('id')}}
+
+
+class DimensionCache:
+    """
+    Справочники в памяти процесса: {модель: {id: объект}}. Загружаются при
+    первом обращении; общая для воркеров версия в кэше увеличивается при
+    любой записи в справочник (сигналы и DimensionQuerySet), после чего таблицы
+    перечитываются. Объекты общие для всех запросов процесса - только
+    для чтения.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = (None, {})
+
+    def tables(self, *dimension_models):
+        version = get_dimensions_version()
+        state_version, tables = self._state
+        if state_version != version:
+            tables = {}
+        missing = [model for model in dimension_models if model not in tables]
+        if missing:
+            with self._lock:
+                for model in missing:
+                    if model not in tables:
+                        tables = {**tables, **_load(model)}
+                self._state = (version, tables)
+        return {model: tables[model] for model in dimension_models}
+
+    def table(self, model):
+        return self.tables(model)[model]
+
+    def clear(self):
+        self._state = (None, {})
+
+
+dimension_cache = DimensionCache()
+
+
+def dimension_list(model):
+    return list(dimension_cache.table(model).values())
+
+
+@functools.cache
+def _dimension_fields(model):
+    return tuple(field for field in model._meta.concrete_fields
+                 if (field.many_to_one or field.one_to_one) and field.related_model in DIMENSIONS)
+
+
+def attach_dimensions(objects, tables=None):
+    """
+    Подстановка объектов справочников во внешние ключи (product.producer и
+    т.д.) по id из кэша, вместо JOIN или запроса на каждый объект.
+    Возвращает список объектов.
+    """
+    objects = list(objects)
+    if not objects:
+        return objects
+    fields = _dimension_fields(type(objects[0]))
+    if tables is None:
+        tables = dimension_cache.tables(*{field.related_model for field in fields})
+    for obj in objects:
+        for field in fields:
+            related = tables[field.related_model].get(getattr(obj, field.attname))
+            # Запись, которой еще нет в кэше, загрузится обычным запросом
+            if related is not None:
+                field.set_cached_value(obj, related)
+    return objects
@@ -0,0 +1,113 @@
+import re
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from examapp.models import Order, Product
+from examapp.pagination import KeysetPaginator
+from examapp.pickup import pvz_orders
+from examapp.views import SORT_ORDERING, facet_queryset, filter_products, get_ordering
+
+# Признаки плана без подходящего индекса: полный просмотр таблицы и
+# сортировка результата вместо чтения индекса по порядку
+PLAN_WARNINGS = {
+    'postgresql': (
+        (re.compile(r'Seq Scan on (\w+)'), 'последовательное чтение {}'),
+        (re.compile(r'(?:^|->\s*)Sort\s+\('), 'сортировка без индекса'),
+    ),
+    'sqlite': (
+        (re.compile(r'\bSCAN (?:TABLE )?(\w+)(?! USING (?:COVERING )?INDEX)(?!\w)'), 'последовательное чтение {}'),
+        (re.compile(r'USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)'), 'сортировка без индекса ({})'),
+    ),
+}
+
+
+def product_filters(**kwargs):
+    filters = {'search': '', 'producer': '', 'min_price': '', 'max_price': '', 'discount': '', 'sort': ''}
+    filters.update(kwargs)
+    return filters
+
+
+def product_page(filters):
+    paginator = KeysetPaginator(filter_products(filters), get_ordering(filters), settings.PRODUCTS_PAGE_SIZE)
+    return paginator.page_queryset()
+
+
+def build_querysets():
+    """
+    Запросы, которые выполняют представления: страницы каталога для
+    каждой сортировки (с фильтром по поставщику и без), подсчет, фасеты,
+    поиск по артикулу и выборки заказов (в том числе по коду получения).
+    """
+    product = Product.objects.order_by('id').values('producer_id', 'article').first() or {}
+    producer = str(product.get('producer_id', 0))
+    order = Order.objects.order_by('id').values('client_id', 'status_id', 'pvz_id', 'code', 'number_order').first() or {}
+    since = date.today() - timedelta(days=30)
+
+    querysets = []
+    for sort in ('', *SORT_ORDERING):
+        querysets.append((f'products sort={sort or "id"}', product_page(product_filters(sort=sort))))
+        querysets.append((f'products producer sort={sort or "id"}',
+                          product_page(product_filters(sort=sort, producer=producer))))
+    querysets += [
+        ('products price range', product_page(product_filters(min_price='100', max_price='500',
+                                                              sort='price_asc'))),
+        ('products count producer', filter_products(product_filters(producer=producer)).values('id')),
+        ('product facets', facet_queryset(product_filters())),
+        ('product by article', Product.objects.filter(article=product.get('article', ''))),
+        ('orders by client', Order.objects.filter(client_id=order.get('client_id', 0)).order_by('-date_order')),
+        ('orders by status', Order.objects.filter(status_id=order.get('status_id', 0)).order_by('date_order')),
+        ('orders by date', Order.objects.filter(date_order__gte=since).order_by('date_order')),
+        ('orders by pickup code', pvz_orders(order.get('pvz_id', 0), [order.get('code', 0)])),
+        ('orders by number', Order.objects.filter(number_order=order.get('number_order', 0))),
+    ]
+    return querysets
+
+
+def plan_warnings(plan, vendor, filtered=True):
+    warnings = []
+    for pattern, message in PLAN_WARNINGS.get(vendor, ()):
+        # В SQLite таблица сама является B-деревом по rowid: просмотр без
+        # условий и без временной сортировки уже идет в порядке ключа
+        if vendor == 'sqlite' and not filtered and 'SCAN' in pattern.pattern:
+            continue
+        for line in plan.splitlines():
+            match = pattern.search(line)
+            if match:
+                warnings.append(message.format(*match.groups()))
+    return warnings
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов представлений на текущей базе и отмечает '
+            'последовательные чтения и сортировки без индекса. На маленьких таблицах '
+            'планировщик законно выбирает полный просмотр, поэтому запускать стоит '
+            'после seed_catalog')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Печатать планы целиком')
+        parser.add_argument('--fail-on-warning', action='store_true',
+                            help='Завершиться с ошибкой, если найдены проблемные планы')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in PLAN_WARNINGS:
+            self.stderr.write(f"Разбор планов для {vendor} не поддерживается, планы выводятся как есть")
+
+        flagged = 0
+        for name, queryset in build_querysets():
+            plan = queryset.explain()
+            warnings = plan_warnings(plan, vendor, bool(queryset.query.where))
+            if warnings:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f"{name}: {'; '.join(warnings)}"))
+            else:
+                self.stdout.write(f"{name}: OK")
+            if options['verbose_plans'] or (warnings and options['verbosity'] > 1):
+                self.stdout.write(plan)
+
+        if flagged and options['fail_on_warning']:
+            raise CommandError(f"Запросов без подходящего индекса: {flagged}")
+        self.stdout.write(self.style.SUCCESS(f"Проверено запросов, замечаний: {flagged}"))
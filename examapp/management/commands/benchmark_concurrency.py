@@ -0,0 +1,144 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from examapp.management.commands.benchmark_views import SCENARIOS, current_commit, percentile
+from examapp.management.commands.seed_catalog import BENCH_PASSWORD
+
+DEFAULT_VIEWS = ('home', 'manager', 'admin', 'search')
+
+
+class Command(BaseCommand):
+    help = ('Пропускная способность при одновременных запросах: WSGI-обработчик с '
+            'синхронными представлениями в потоках против ASGI-обработчика с асинхронными '
+            'представлениями в одном цикле событий. Режим both запускает оба варианта '
+            'в отдельных процессах. Данные готовит seed_catalog')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', choices=('wsgi', 'asgi', 'both'), default='both')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=200, help='Число запросов на сценарий')
+        parser.add_argument('--only', nargs='*', default=DEFAULT_VIEWS, help='Имена URL для прогона')
+        parser.add_argument('--output', help='Файл для результатов (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        if options['server'] == 'both':
+            report = self.compare(options)
+        else:
+            # Тестовый клиент обращается к хосту testserver
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                report = self.run(options)
+        report = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(report)
+        else:
+            self.stdout.write(report)
+
+    def compare(self, options):
+        # Набор представлений выбирается в exam/urls.py при импорте,
+        # поэтому каждый вариант запускается в своем процессе
+        reports = {}
+        for server in ('wsgi', 'asgi'):
+            env = {**os.environ, 'EXAM_ASYNC_VIEWS': '1' if server == 'asgi' else '0'}
+            command = [sys.executable, sys.argv[0], 'benchmark_concurrency', '--server', server,
+                       '--concurrency', str(options['concurrency']), '--requests', str(options['requests']),
+                       '--only', *options['only']]
+            result = subprocess.run(command, env=env, capture_output=True, text=True)
+            if result.returncode:
+                raise CommandError(f"Прогон {server} завершился с ошибкой:\n{result.stderr}")
+            reports[server] = json.loads(result.stdout)
+
+        wsgi = {r['name']: r['rps'] for r in reports['wsgi']['results']}
+        speedup = {r['name']: round(r['rps'] / wsgi[r['name']], 2)
+                   for r in reports['asgi']['results'] if wsgi.get(r['name'])}
+        return {**reports, 'asgi_speedup': speedup}
+
+    def scenarios(self, options):
+        for name in options['only']:
+            if name not in SCENARIOS:
+                raise CommandError(f"Нет сценария для {name}")
+            role, method, data = SCENARIOS[name][0]
+            if method != 'get':
+                raise CommandError(f"Сценарий {name} меняет состояние и не подходит для нагрузки")
+            yield name, role, data
+
+    def login_cookies(self, role):
+        client = Client()
+        if role and not client.login(username=f'bench_{role}', password=BENCH_PASSWORD):
+            raise CommandError(f"Нет пользователя bench_{role}: сначала запустите seed_catalog")
+        return client.cookies
+
+    def run(self, options):
+        runner = self.run_asgi if options['server'] == 'asgi' else self.run_wsgi
+        results = []
+        for name, role, data in self.scenarios(options):
+            cookies = self.login_cookies(role)
+            started = time.perf_counter()
+            timings, errors = runner(reverse(name), data, cookies, options)
+            wall_time = time.perf_counter() - started
+            results.append({
+                'name': name, 'role': role, 'params': data, 'requests': len(timings), 'errors': errors,
+                'rps': round(len(timings) / wall_time, 1),
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+            })
+        return {'commit': current_commit(), 'server': options['server'], 'async_views': settings.ASYNC_VIEWS,
+                'concurrency': options['concurrency'], 'results': results}
+
+    def run_wsgi(self, url, data, cookies, options):
+        timings, errors = [], []
+
+        def worker(count):
+            client = Client()
+            client.cookies = cookies
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    response = client.get(url, data)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200:
+                        errors.append(response.status_code)
+            finally:
+                connection.close()
+
+        concurrency = options['concurrency']
+        counts = [options['requests'] // concurrency + (i < options['requests'] % concurrency)
+                  for i in range(concurrency)]
+        threads = [threading.Thread(target=worker, args=(count,)) for count in counts if count]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return timings, len(errors)
+
+    def run_asgi(self, url, data, cookies, options):
+        timings, errors = [], []
+
+        async def main():
+            client = AsyncClient()
+            client.cookies = cookies
+            semaphore = asyncio.Semaphore(options['concurrency'])
+
+            async def send():
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.get(url, data)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200:
+                        errors.append(response.status_code)
+
+            await asyncio.gather(*(send() for _ in range(options['requests'])))
+
+        asyncio.run(main())
+        return timings, len(errors)
@@ -0,0 +1,118 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from examapp.models import CategoryProduct, Manufacturer, Producer, Product, StockReservation
+from examapp.stock import InsufficientStock, reserve_stock
+
+ARTICLE_PREFIX = 'STRESS-'
+KEY_PREFIX = 'stress:'
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочная проверка списания остатков: несколько потоков одновременно '
+            'списывают случайные строки заказов с небольшого набора товаров. Проверяет, '
+            'что остатки не ушли в минус и сходятся со списаниями, и выводит число '
+            'списаний в секунду. Работает на отдельных временных товарах')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--orders', type=int, default=2000, help='Число заказов на все потоки')
+        parser.add_argument('--products', type=int, default=10)
+        parser.add_argument('--stock', type=int, default=500, help='Начальный остаток каждого товара')
+        parser.add_argument('--lines', type=int, default=3, help='Наибольшее число строк в заказе')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='Не удалять временные товары')
+
+    def handle(self, *args, **options):
+        self.cleanup()
+        articles = self.create_products(options['products'], options['stock'])
+        try:
+            report = self.run(articles, options)
+        finally:
+            if not options['keep']:
+                self.cleanup()
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+
+    def cleanup(self):
+        StockReservation.objects.filter(key__startswith=KEY_PREFIX).delete()
+        Product.objects.filter(article__startswith=ARTICLE_PREFIX).delete()
+
+    def create_products(self, count, stock):
+        name = 'Нагрузочный тест'
+        producer = Producer.objects.get_or_create(name=name)[0]
+        manufacturer = Manufacturer.objects.get_or_create(name=name)[0]
+        category = CategoryProduct.objects.get_or_create(name=name)[0]
+        Product.objects.bulk_create([
+            Product(article=f'{ARTICLE_PREFIX}{i}', product=f'{name} {i}', unit='шт.', price=1, discount=0,
+                    amount_on_warehouse=stock, description='', producer=producer, manufacturer=manufacturer,
+                    category=category, image='stub.jpg')
+            for i in range(count)
+        ])
+        return [f'{ARTICLE_PREFIX}{i}' for i in range(count)]
+
+    def run(self, articles, options):
+        stats = Counter()
+        lock = threading.Lock()
+
+        def worker(number, count):
+            rnd = random.Random(options['seed'] * 1000 + number)
+            local = Counter()
+            try:
+                for i in range(count):
+                    lines = {article: rnd.randint(1, 5)
+                             for article in rnd.sample(articles, rnd.randint(1, min(options['lines'], len(articles))))}
+                    key = f'{KEY_PREFIX}{number}:{i}'
+                    try:
+                        reserve_stock(key, lines)
+                    except InsufficientStock:
+                        local['rejected'] += 1
+                        continue
+                    except DatabaseError:
+                        local['errors'] += 1
+                        continue
+                    local['reserved'] += 1
+                    # Повтор того же заказа не должен списать второй раз
+                    if i % 10 == 0:
+                        local['duplicates_applied' if reserve_stock(key, lines) else 'duplicates_ignored'] += 1
+            finally:
+                connection.close()
+                with lock:
+                    stats.update(local)
+
+        threads_count = options['threads']
+        counts = [options['orders'] // threads_count + (i < options['orders'] % threads_count)
+                  for i in range(threads_count)]
+        threads = [threading.Thread(target=worker, args=(n, count)) for n, count in enumerate(counts)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_time = time.perf_counter() - started
+
+        reserved = Counter()
+        for lines in StockReservation.objects.filter(key__startswith=KEY_PREFIX).values_list('lines', flat=True):
+            for article, quantity in lines.items():
+                reserved[article] += Decimal(quantity)
+        stock = dict(Product.objects.filter(article__in=articles).values_list('article', 'amount_on_warehouse'))
+        mismatched = [a for a in articles if stock[a] != options['stock'] - reserved[a]]
+
+        return {
+            'threads': threads_count,
+            'orders': options['orders'],
+            'reserved': stats['reserved'],
+            'rejected': stats['rejected'],
+            'duplicates_ignored': stats['duplicates_ignored'],
+            'duplicates_applied': stats['duplicates_applied'],
+            'errors': stats['errors'],
+            'reservations_per_second': round(stats['reserved'] / wall_time, 1),
+            'oversold': [a for a in articles if stock[a] < 0],
+            'mismatched': mismatched,
+        }
@@ -0,0 +1,143 @@
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import URLPattern, reverse
+
+from exam import urls
+from examapp.management.commands.seed_catalog import BENCH_PASSWORD
+from examapp.querybudget import QueryCounter
+
+# Сценарии для именованных URL из exam/urls.py: роль пользователя (None -
+# гость), метод и параметры запроса
+SCENARIOS = {
+    'home': [(None, 'get', {})],
+    'client': [('client', 'get', {})],
+    'manager': [
+        ('manager', 'get', {}),
+        ('manager', 'get', {'search': 'дрель', 'sort': 'amount_desc'}),
+        ('manager', 'get', {'sort': 'price_asc', 'discount': '1'}),
+    ],
+    'admin': [('admin', 'get', {})],
+    'search': [(None, 'get', {'q': 'акк'})],
+    'login': [
+        (None, 'get', {}),
+        (None, 'post', {'username': 'bench_manager', 'password': BENCH_PASSWORD}),
+    ],
+    'logout': [('manager', 'get', {})],
+    'export_products': [('manager', 'get', {'search': 'дрель'})],
+    'metrics': [('admin', 'get', {})],
+    'orders_dashboard': [('manager', 'get', {})],
+}
+
+
+def percentile(values, p):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[p - 1]
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет каждый URL из exam/urls.py через тестовый клиент и выводит p50/p95/p99, '
+            'число запросов и пиковую память в JSON. Данные готовит seed_catalog')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--only', nargs='*', help='Имена URL для прогона')
+        parser.add_argument('--output', help='Файл для результатов (по умолчанию stdout)')
+
+    def make_client(self, role):
+        client = Client()
+        if role and not client.login(username=f'bench_{role}', password=BENCH_PASSWORD):
+            raise CommandError(f"Нет пользователя bench_{role}: сначала запустите seed_catalog")
+        return client
+
+    def client_for_request(self, role, method, url):
+        # Вход и выход меняют сессию, поэтому для них клиент создается заново
+        if method == 'post' or url == reverse('logout'):
+            return self.make_client(role)
+        return self.clients[role]
+
+    @staticmethod
+    def send(client, method, url, data):
+        response = getattr(client, method)(url, data)
+        if getattr(response, 'streaming', False):
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    def handle(self, *args, **options):
+        # Тестовый клиент обращается к хосту testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            report = self.run(options)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(report)
+        else:
+            self.stdout.write(report)
+
+    def run(self, options):
+        self.clients = {role: self.make_client(role) for role in {s[0] for ss in SCENARIOS.values() for s in ss}}
+        results, skipped = [], []
+        for pattern in urls.urlpatterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name:
+                continue
+            if options['only'] and pattern.name not in options['only']:
+                continue
+            if pattern.name not in SCENARIOS:
+                skipped.append(pattern.name)
+                continue
+            for role, method, data in SCENARIOS[pattern.name]:
+                results.append(self.run_scenario(pattern.name, role, method, data, options))
+
+        return json.dumps({'commit': current_commit(), 'iterations': options['iterations'],
+                           'results': results, 'skipped': skipped}, ensure_ascii=False, indent=2)
+
+    def run_scenario(self, name, role, method, data, options):
+        url = reverse(name)
+        for _ in range(options['warmup']):
+            self.send(self.client_for_request(role, method, url), method, url, data)
+
+        timings = []
+        for _ in range(options['iterations']):
+            client = self.client_for_request(role, method, url)
+            started = time.perf_counter()
+            response = self.send(client, method, url, data)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        # Запросы и память меряются отдельными прогонами, чтобы не искажать время
+        client = self.client_for_request(role, method, url)
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            self.send(client, method, url, data)
+        client = self.client_for_request(role, method, url)
+        tracemalloc.start()
+        self.send(client, method, url, data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'name': name, 'url': url, 'role': role, 'method': method, 'params': data,
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries': queries.count,
+            'write_queries': queries.writes,
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
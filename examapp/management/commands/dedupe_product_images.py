@@ -0,0 +1,37 @@
+import posixpath
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from examapp.models import Product
+from examapp.storage import ContentAddressedStorage, acquire_image, product_image_storage
+
+
+class Command(BaseCommand):
+    help = 'Переносит изображения товаров в хранилище по хэшу содержимого, объединяя одинаковые файлы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-originals', action='store_true',
+                            help='Удалить исходные файлы после переноса')
+
+    def handle(self, *args, **options):
+        names = (Product.objects.exclude(image='').order_by()
+                 .values_list('image', flat=True).distinct())
+        moved = 0
+        for name in list(names):
+            if ContentAddressedStorage.is_content_addressed(name):
+                continue
+            if not product_image_storage.exists(name):
+                self.stderr.write(f"Файл не найден: {name}")
+                continue
+            upload_name = Product._meta.get_field('image').generate_filename(None, posixpath.basename(name))
+            with product_image_storage.open(name) as original:
+                hashed = product_image_storage.save(upload_name, original)
+            with transaction.atomic():
+                count = Product.objects.filter(image=name).update(image=hashed)
+                acquire_image(hashed, count)
+            if options['delete_originals']:
+                product_image_storage.delete(name)
+            moved += 1
+            self.stdout.write(f"{name} -> {hashed} ({count} товаров)")
+        self.stdout.write(self.style.SUCCESS(f"Перенесено файлов: {moved}"))
@@ -0,0 +1,45 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from examapp.models import Product
+from examapp.storage import product_image_storage
+from examapp.thumbnails import derivative_targets, derivatives_ready, render_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Генерирует миниатюры для уже загруженных изображений товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.THUMBNAIL_WORKERS)
+        parser.add_argument('--force', action='store_true', help='Пересоздать уже готовые миниатюры')
+
+    def handle(self, *args, **options):
+        names = (Product.objects.exclude(image='').order_by()
+                 .values_list('image', flat=True).distinct().iterator())
+        pending = [
+            name for name in names
+            if product_image_storage.exists(name)
+            and (options['force'] or not derivatives_ready(name, product_image_storage))
+        ]
+        self.stdout.write(f"Изображений без миниатюр: {len(pending)}")
+
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'],
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {
+                executor.submit(render_derivatives, product_image_storage.path(name),
+                                derivative_targets(name, product_image_storage)): name
+                for name in pending
+            }
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    failed += 1
+                    self.stderr.write(f"{futures[future]}: {future.exception()}")
+                else:
+                    done += 1
+                if (done + failed) % 100 == 0:
+                    self.stdout.write(f"Обработано {done + failed} из {len(pending)}")
+        self.stdout.write(self.style.SUCCESS(f"Готово: {done}, ошибок: {failed}"))
@@ -0,0 +1,176 @@
+import csv
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from examapp.models import CategoryProduct, Manufacturer, Producer, Product
+
+REQUIRED_COLUMNS = ('article', 'product', 'unit', 'price', 'producer', 'manufacturer', 'category')
+DECIMAL_COLUMNS = ('price', 'discount', 'amount_on_warehouse')
+# Значения проверяются правилами полей модели (длина строки, число
+# знаков), иначе ошибка одной строки прервала бы запись всей пачки
+COLUMN_FIELDS = {
+    **{column: Product._meta.get_field(column)
+       for column in ('article', 'product', 'unit', 'price', 'discount', 'amount_on_warehouse', 'description')},
+    'producer': Producer._meta.get_field('name'),
+    'manufacturer': Manufacturer._meta.get_field('name'),
+    'category': CategoryProduct._meta.get_field('name'),
+}
+UPDATE_FIELDS = ('product', 'unit', 'price', 'producer', 'manufacturer', 'category',
+                 'discount', 'amount_on_warehouse', 'description')
+
+
+class RowError(ValueError):
+    pass
+
+
+class NameCache:
+    """
+    Кэш name -> id для справочника. Справочники маленькие, поэтому
+    загружаются целиком; отсутствующие названия создаются пачкой.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.ids = dict(model.objects.values_list('name', 'id'))
+        self.created = 0
+
+    def resolve(self, names):
+        missing = {name for name in names if name not in self.ids}
+        if missing:
+            self.model.objects.bulk_create([self.model(name=name) for name in missing])
+            self.ids.update(self.model.objects.filter(name__in=missing).values_list('name', 'id'))
+            self.created += len(missing)
+
+
+def read_csv(path, delimiter):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f, delimiter=delimiter)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def read_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise CommandError("Для импорта XLSX установите openpyxl")
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else '' for h in next(rows, ())]
+        for line_num, values in enumerate(rows, start=2):
+            yield line_num, {k: '' if v is None else str(v) for k, v in zip(header, values)}
+    finally:
+        workbook.close()
+
+
+def parse_row(row):
+    data = {k.strip(): (v or '').strip() for k, v in row.items() if k}
+    for column in REQUIRED_COLUMNS:
+        if not data.get(column):
+            raise RowError(f"пустое поле {column}")
+    for column in DECIMAL_COLUMNS:
+        value = data.get(column) or '0'
+        try:
+            data[column] = Decimal(value.replace(',', '.').replace(' ', ''))
+        except InvalidOperation:
+            raise RowError(f"некорректное число в поле {column}: {value!r}")
+    for column, field in COLUMN_FIELDS.items():
+        if not data.get(column) and column not in DECIMAL_COLUMNS:
+            continue
+        try:
+            data[column] = field.clean(data[column], None)
+        except ValidationError as e:
+            raise RowError(f"некорректное значение в поле {column}: {' '.join(e.messages)}")
+    return data
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт прайс-листа поставщика (CSV/XLSX) с обновлением товаров по артикулу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--delimiter', default=',')
+        parser.add_argument('--max-errors', type=int, default=1000,
+                            help='Прервать импорт после стольких ошибочных строк')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"Файл не найден: {path}")
+        if path.lower().endswith('.xlsx'):
+            rows = read_xlsx(path)
+        else:
+            rows = read_csv(path, options['delimiter'])
+
+        self.caches = {
+            'producer': NameCache(Producer),
+            'manufacturer': NameCache(Manufacturer),
+            'category': NameCache(CategoryProduct),
+        }
+        self.created = self.updated = self.errors = self.processed = 0
+
+        batch = {}
+        for line_num, row in rows:
+            self.processed += 1
+            try:
+                data = parse_row(row)
+            except RowError as e:
+                self.report_error(line_num, e, options['max_errors'])
+                continue
+            # Повтор артикула внутри пачки: побеждает последняя строка
+            batch[data['article']] = data
+            if len(batch) >= options['batch_size']:
+                self.write_batch(batch)
+                batch = {}
+        if batch:
+            self.write_batch(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Импорт завершен: строк {self.processed}, создано {self.created}, обновлено {self.updated}, "
+            f"ошибок {self.errors}, новых записей справочников "
+            f"{sum(c.created for c in self.caches.values())}"))
+
+    def report_error(self, line_num, error, max_errors):
+        self.errors += 1
+        self.stderr.write(f"Строка {line_num}: {error}")
+        if self.errors >= max_errors:
+            raise CommandError(f"Превышено число ошибок ({max_errors}), импорт прерван")
+
+    @transaction.atomic
+    def write_batch(self, batch):
+        for field, cache in self.caches.items():
+            cache.resolve({data[field] for data in batch.values()})
+        existing = dict(Product.objects.filter(article__in=batch.keys()).values_list('article', 'id'))
+
+        to_create, to_update = [], []
+        for article, data in batch.items():
+            product = Product(
+                id=existing.get(article),
+                article=article,
+                product=data['product'],
+                unit=data['unit'],
+                price=data['price'],
+                producer_id=self.caches['producer'].ids[data['producer']],
+                manufacturer_id=self.caches['manufacturer'].ids[data['manufacturer']],
+                category_id=self.caches['category'].ids[data['category']],
+                discount=data['discount'],
+                amount_on_warehouse=data['amount_on_warehouse'],
+                description=data.get('description', ''),
+                image=data.get('image', ''),
+            )
+            (to_update if product.id else to_create).append(product)
+
+        if to_create:
+            Product.objects.bulk_create(to_create)
+        if to_update:
+            Product.objects.bulk_update(to_update, UPDATE_FIELDS)
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        self.stdout.write(f"Обработано строк: {self.processed} (создано {self.created}, "
+                          f"обновлено {self.updated}, ошибок {self.errors})")
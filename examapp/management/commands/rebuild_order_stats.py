@@ -0,0 +1,38 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from examapp.models import Order
+from examapp.orderstats import SUMMARIES
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводные таблицы по заказам (по статусам, ПВЗ и датам доставки)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        fields = [field for _, field in SUMMARIES]
+        counters = [Counter() for _ in SUMMARIES]
+        last_id, total = 0, 0
+        # Заказы читаются порциями по первичному ключу, без OFFSET
+        while True:
+            batch = list(Order.objects.filter(id__gt=last_id).order_by('id')
+                         .values_list('id', *fields)[:options['batch_size']])
+            if not batch:
+                break
+            for row in batch:
+                for counter, value in zip(counters, row[1:]):
+                    counter[value] += 1
+            last_id = batch[-1][0]
+            total += len(batch)
+            self.stdout.write(f"Обработано заказов: {total}")
+
+        with transaction.atomic():
+            for (model, field), counter in zip(SUMMARIES, counters):
+                model.objects.all().delete()
+                model.objects.bulk_create([model(**{field: value, 'orders': count})
+                                           for value, count in counter.items()], batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f"Сводные таблицы пересчитаны по {total} заказам"))
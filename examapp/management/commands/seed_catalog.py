@@ -0,0 +1,126 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from examapp.models import (CategoryProduct, Manufacturer, Order, Producer, Product, Pvz,
+                            StatusOrder)
+from examapp.roles import ROLE_GROUPS
+
+UNITS = ('шт.', 'упак.', 'кг', 'м', 'л')
+ADJECTIVES = ('Аккумуляторная', 'Сетевая', 'Профессиональная', 'Компактная', 'Усиленная', 'Бытовая')
+NOUNS = ('дрель', 'пила', 'шлифмашина', 'отвертка', 'лампа', 'розетка', 'кабель', 'краска', 'плитка')
+CITIES = ('Москва', 'Санкт-Петербург', 'Казань', 'Новосибирск', 'Екатеринбург', 'Самара')
+STATUSES = ('Новый', 'В пути', 'Готов к выдаче', 'Выдан')
+BENCH_PASSWORD = 'bench12345'
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими данными заданного масштаба для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--producers', type=int, default=50)
+        parser.add_argument('--manufacturers', type=int, default=50)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--pvz', type=int, default=100)
+        parser.add_argument('--clients', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора для воспроизводимости')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        with transaction.atomic():
+            producers = self.create_named(Producer, 'Поставщик', options['producers'])
+            manufacturers = self.create_named(Manufacturer, 'Производитель', options['manufacturers'])
+            categories = self.create_named(CategoryProduct, 'Категория', options['categories'])
+            statuses = [StatusOrder.objects.get_or_create(name=name)[0].id for name in STATUSES]
+            pvz = self.create_pvz(options['pvz'])
+            clients = self.create_users(options['clients'])
+
+        articles = self.create_products(options['products'], producers, manufacturers, categories)
+        self.create_orders(options['orders'], articles, pvz, clients, statuses)
+        # bulk_create не вызывает сигналы, поэтому сводки по заказам пересчитываются целиком
+        call_command('rebuild_order_stats', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано товаров: {options['products']}, заказов: {options['orders']}. "
+            f"Пользователи bench_admin, bench_manager, bench_client с паролем {BENCH_PASSWORD}"))
+
+    def batches(self, count, make):
+        for start in range(0, count, self.batch_size):
+            yield [make(i) for i in range(start, min(start + self.batch_size, count))]
+
+    def create_named(self, model, prefix, count):
+        model.objects.bulk_create([model(name=f'{prefix} {i + 1}') for i in range(count)])
+        return list(model.objects.values_list('id', flat=True))
+
+    def create_pvz(self, count):
+        rnd = self.random
+        Pvz.objects.bulk_create([
+            Pvz(index=rnd.randint(100000, 999999), city=rnd.choice(CITIES),
+                street=f'ул. {rnd.choice(NOUNS).capitalize()}ная', number=rnd.randint(1, 200))
+            for _ in range(count)
+        ])
+        return list(Pvz.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        # Один хэш на всех клиентов: PBKDF2 для каждого занял бы минуты
+        password = make_password(BENCH_PASSWORD)
+        existing = set(User.objects.filter(username__startswith='bench_').values_list('username', flat=True))
+        users = [User(username=f'bench_client_{i}', password=password) for i in range(count)]
+        User.objects.bulk_create([u for u in users if u.username not in existing])
+
+        for role, group_name in ROLE_GROUPS:
+            group = Group.objects.get_or_create(name=group_name)[0]
+            user, _ = User.objects.get_or_create(username=f'bench_{role}', defaults={'password': password})
+            user.groups.add(group)
+        # Администратор - персонал, чтобы бенчмарк мог открыть /metrics/
+        User.objects.filter(username='bench_admin').update(is_staff=True)
+        return list(User.objects.filter(username__startswith='bench_client_').values_list('id', flat=True))
+
+    def create_products(self, count, producers, manufacturers, categories):
+        rnd = self.random
+        prefix = f'S{rnd.randint(0, 10 ** 6):06d}-'
+
+        def make(i):
+            price = Decimal(rnd.randint(100, 100000)) / 100
+            discount = rnd.choice((0, 0, 0, 5, 10, 15, 20, 30))
+            return Product(
+                article=f'{prefix}{i:07d}', product=f'{rnd.choice(ADJECTIVES)} {rnd.choice(NOUNS)} {i}',
+                unit=rnd.choice(UNITS), price=price, discount=discount,
+                amount_on_warehouse=rnd.randint(0, 500), description=f'Описание товара {i}',
+                producer_id=rnd.choice(producers), manufacturer_id=rnd.choice(manufacturers),
+                category_id=rnd.choice(categories), image='stub.jpg',
+            )
+
+        for n, batch in enumerate(self.batches(count, make), start=1):
+            Product.objects.bulk_create(batch)
+            self.stdout.write(f"Товары: {min(n * self.batch_size, count)} из {count}")
+        return [f'{prefix}{i:07d}' for i in range(min(count, 1000))]
+
+    def create_orders(self, count, articles, pvz, clients, statuses):
+        if not count or not articles or not clients:
+            return
+        rnd = self.random
+        today = date.today()
+
+        def make(i):
+            date_order = today - timedelta(days=rnd.randint(0, 365))
+            return Order(
+                number_order=i + 1, arcticle=rnd.choice(articles), amount_product=rnd.randint(1, 10),
+                date_order=date_order, date_delivery=date_order + timedelta(days=rnd.randint(1, 14)),
+                pvz_id=rnd.choice(pvz), client_id=rnd.choice(clients), code=rnd.randint(100, 999),
+                status_id=rnd.choice(statuses),
+            )
+
+        for n, batch in enumerate(self.batches(count, make), start=1):
+            Order.objects.bulk_create(batch)
+            self.stdout.write(f"Заказы: {min(n * self.batch_size, count)} из {count}")
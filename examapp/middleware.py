@@ -0,0 +1,166 @@
+import contextvars
+import heapq
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.base import Template
+
+from .metrics import COUNT_BUCKETS, DURATION_BUCKETS, registry
+from .querybudget import track_queries
+from .routers import PIN_COOKIE, record_writes
+
+logger = logging.getLogger(__name__)
+
+_current_tracker = contextvars.ContextVar('performance_tracker', default=None)
+
+
+class RequestTracker:
+    """
+    Счетчики одного запроса: число и суммарное время SQL (через
+    track_queries), несколько самых медленных запросов и время
+    отрисовки шаблонов. Асинхронные представления выполняют запросы из
+    нескольких потоков, поэтому SQL-счетчики защищены блокировкой.
+    """
+
+    def __init__(self, keep_slowest):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.keep_slowest = keep_slowest
+        self.slowest = []
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            with self._lock:
+                self.queries += 1
+                self.sql_time += duration
+                if len(self.slowest) < self.keep_slowest:
+                    heapq.heappush(self.slowest, (duration, self.queries, sql))
+                elif duration > self.slowest[0][0]:
+                    heapq.heapreplace(self.slowest, (duration, self.queries, sql))
+
+
+def _instrument_templates():
+    # Замер времени отрисовки: учитывается только внешний шаблон,
+    # вложенные include уже входят в его время
+    if getattr(Template.render, 'instrumented', False):
+        return
+    original_render = Template.render
+
+    def render(self, context):
+        tracker = _current_tracker.get()
+        if tracker is None:
+            return original_render(self, context)
+        tracker.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            tracker.template_depth -= 1
+            if tracker.template_depth == 0:
+                tracker.template_time += time.perf_counter() - started
+
+    render.instrumented = True
+    Template.render = render
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Под ASGI middleware не должен переводить цепочку в синхронный
+        # режим, иначе асинхронные представления теряют смысл
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        _instrument_templates()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tracker = RequestTracker(settings.SLOW_REQUEST_LOG_QUERIES)
+        token = _current_tracker.set(tracker)
+        started = time.perf_counter()
+        try:
+            with track_queries(tracker):
+                response = self.get_response(request)
+        finally:
+            _current_tracker.reset(token)
+        self.record(request, tracker, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        tracker = RequestTracker(settings.SLOW_REQUEST_LOG_QUERIES)
+        token = _current_tracker.set(tracker)
+        started = time.perf_counter()
+        try:
+            with track_queries(tracker):
+                response = await self.get_response(request)
+        finally:
+            _current_tracker.reset(token)
+        self.record(request, tracker, time.perf_counter() - started)
+        return response
+
+    def record(self, request, tracker, wall_time):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        registry.histogram('exam_request_duration_seconds', 'Время обработки запроса',
+                           DURATION_BUCKETS, view=view).observe(wall_time)
+        registry.histogram('exam_request_sql_seconds', 'Суммарное время SQL за запрос',
+                           DURATION_BUCKETS, view=view).observe(tracker.sql_time)
+        registry.histogram('exam_request_queries', 'Число SQL-запросов за запрос',
+                           COUNT_BUCKETS, view=view).observe(tracker.queries)
+        registry.histogram('exam_request_template_seconds', 'Время отрисовки шаблонов за запрос',
+                           DURATION_BUCKETS, view=view).observe(tracker.template_time)
+
+        if wall_time * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            slowest = '\n'.join(f"  {duration * 1000:.1f} мс: {sql}"
+                                for duration, _, sql in sorted(tracker.slowest, reverse=True))
+            logger.warning(f"Медленный запрос {request.method} {request.path} ({view}): "
+                           f"{wall_time * 1000:.1f} мс, SQL {tracker.queries} запросов за "
+                           f"{tracker.sql_time * 1000:.1f} мс, шаблоны {tracker.template_time * 1000:.1f} мс\n"
+                           f"{slowest}")
+
+
+class PrimaryPinMiddleware:
+    """
+    После записи в каталог клиент на REPLICA_PIN_SECONDS закрепляется за
+    основной базой, чтобы сразу видеть свои изменения, пока реплика
+    догоняет.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with record_writes() as writes:
+            response = self.get_response(request)
+        return self.pin(response, writes)
+
+    async def __acall__(self, request):
+        with record_writes() as writes:
+            response = await self.get_response(request)
+        return self.pin(response, writes)
+
+    @staticmethod
+    def pin(response, writes):
+        if writes.wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
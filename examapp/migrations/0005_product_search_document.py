@@ -0,0 +1,56 @@
+# Generated by Django 4.2.27 on 2026-10-18 16:35
+
+from django.db import migrations, models
+
+from examapp.search import build_search_document
+
+
+def fill_search_document(apps, schema_editor):
+    Product = apps.get_model('examapp', 'Product')
+    products = Product.objects.using(schema_editor.connection.alias).select_related('producer', 'manufacturer')
+    batch = []
+    for product in products.iterator(chunk_size=1000):
+        product.search_document = build_search_document(product, product.producer.name, product.manufacturer.name)
+        batch.append(product)
+        if len(batch) == 1000:
+            Product.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    Product.objects.bulk_update(batch, ['search_document'])
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS examapp_product_search_document_trgm '
+        'ON examapp_product USING gin (search_document gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS examapp_product_search_document_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examapp', '0004_rename_description_order_arcticle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_document',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(upload_to='media/'),
+        ),
+        migrations.RunPython(fill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
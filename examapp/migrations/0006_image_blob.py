@@ -0,0 +1,27 @@
+# Generated by Django 4.2.27 on 2026-10-18 16:39
+
+from django.db import migrations, models
+import examapp.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examapp', '0005_product_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(storage=examapp.storage.get_product_image_storage, upload_to='media/'),
+        ),
+    ]
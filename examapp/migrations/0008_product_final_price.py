@@ -0,0 +1,33 @@
+# Generated by Django 4.2.27 on 2026-10-18 16:44
+
+from django.db import migrations, models
+from django.db.models import Case, F, When
+
+
+def fill_final_price(apps, schema_editor):
+    Product = apps.get_model('examapp', 'Product')
+    Product.objects.using(schema_editor.connection.alias).update(final_price=Case(
+        When(discount__gt=0, then=F('price') * (100 - F('discount')) / 100),
+        default=F('price'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examapp', '0007_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='final_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(fill_final_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['final_price', 'id'], name='product_final_price_id_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.27 on 2026-10-18 16:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examapp', '0008_product_final_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderDeliverySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_delivery', models.DateField(unique=True)),
+                ('orders', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderStatusSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.IntegerField(default=0)),
+                ('status', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='examapp.statusorder')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderPvzSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.IntegerField(default=0)),
+                ('pvz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='examapp.pvz')),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-18 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examapp', '0011_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['producer', 'manufacturer', 'category'], name='product_facets_idx'),
+        ),
+    ]
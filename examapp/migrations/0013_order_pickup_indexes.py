@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examapp', '0012_product_facets_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['pvz', 'code'], name='order_pvz_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['number_order'], name='order_number_idx'),
+        ),
+    ]
@@ -1,6 +1,38 @@
+from decimal import Decimal, ROUND_HALF_UP
+
 from django.db import models
+from django.db.models import Case, F, Value, When
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
 from django.contrib.auth.models import User, AbstractUser, Group
 
+from .caching import bump_catalog_version, bump_dimensions_version
+from .search import build_search_document, fill_search_documents
+from .storage import get_product_image_storage
+
+
+class DimensionQuerySet(models.QuerySet):
+    # Массовые операции со справочниками не вызывают сигналы, поэтому
+    # версии кэша справочников (examapp.dimensions) и каталога увеличиваются здесь
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        self._bump_versions()
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        self._bump_versions()
+        return updated
+
+    def update(self, **kwargs):
+        updated = super().update(**kwargs)
+        self._bump_versions()
+        return updated
+
+    def _bump_versions(self):
+        bump_dimensions_version()
+        bump_catalog_version()
+
 
 class Pvz(models.Model):
     index = models.DecimalField(max_digits=10, decimal_places=2)
@@ -8,18 +40,86 @@ class Pvz(models.Model):
     street = models.CharField(max_length=255)
     number = models.DecimalField(max_digits=10, decimal_places=2)
 
+    objects = DimensionQuerySet.as_manager()
+
 class Producer(models.Model):
     name = models.CharField(max_length=255)
 
+    objects = DimensionQuerySet.as_manager()
+
 class Manufacturer(models.Model):
     name = models.CharField(max_length=255)
 
+    objects = DimensionQuerySet.as_manager()
+
 class CategoryProduct(models.Model):
     name = models.CharField(max_length=255)
 
+    objects = DimensionQuerySet.as_manager()
+
 class StatusOrder(models.Model):
     name = models.CharField(max_length=255)
 
+    objects = DimensionQuerySet.as_manager()
+
+def compute_final_price(price, discount):
+    if discount > 0:
+        price = price * (100 - discount) / 100
+    return Decimal(price).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def final_price_expression(price=F('price'), discount=F('discount')):
+    # То же, что compute_final_price, но на стороне СУБД
+    if not hasattr(price, 'resolve_expression'):
+        price = Value(price)
+    if not hasattr(discount, 'resolve_expression'):
+        discount = Value(discount)
+    return Case(
+        When(GreaterThan(discount, 0), then=price * (100 - discount) / 100),
+        default=price,
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    # Массовые операции не вызывают save() и сигналы, поэтому
+    # денормализованные поля заполняются, а версия каталога увеличивается здесь
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = fill_search_documents(objs)
+        for obj in objs:
+            obj.final_price = compute_final_price(obj.price, obj.discount)
+        created = super().bulk_create(objs, *args, **kwargs)
+        bump_catalog_version()
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = fill_search_documents(objs)
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_at = now
+            obj.final_price = compute_final_price(obj.price, obj.discount)
+        fields = list(fields)
+        for field in ('search_document', 'final_price', 'updated_at'):
+            if field not in fields:
+                fields.append(field)
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        bump_catalog_version()
+        return updated
+
+    def update(self, **kwargs):
+        # auto_now не срабатывает при update(), а по updated_at
+        # инвалидируются закэшированные карточки товаров
+        kwargs.setdefault('updated_at', timezone.now())
+        if 'price' in kwargs or 'discount' in kwargs:
+            # В UPDATE правые части видят старые значения столбцов, поэтому
+            # в выражение подставляются новые цена и скидка
+            kwargs['final_price'] = final_price_expression(kwargs.get('price', F('price')),
+                                                           kwargs.get('discount', F('discount')))
+        updated = super().update(**kwargs)
+        bump_catalog_version()
+        return updated
+
+
 class Product(models.Model):
     article = models.CharField(max_length=255)
     product = models.CharField(max_length=255)
@@ -31,7 +131,33 @@ class Product(models.Model):
     discount = models.DecimalField(max_digits=10,decimal_places=2)
     amount_on_warehouse = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.CharField(max_length=255)
-    image = models.ImageField(upload_to='media/')
+    image = models.ImageField(upload_to='media/', storage=get_product_image_storage)
+    search_document = models.TextField(default='', editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Цена со скидкой, хранится для сортировки и фильтрации на стороне СУБД
+    final_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['final_price', 'id'], name='product_final_price_id_idx'),
+            models.Index(fields=['amount_on_warehouse', 'id'], name='product_amount_id_idx'),
+            models.Index(fields=['producer', 'amount_on_warehouse', 'id'], name='product_producer_amount_idx'),
+            models.Index(fields=['producer', 'final_price', 'id'], name='product_producer_price_idx'),
+            models.Index(fields=['article'], name='product_article_idx'),
+            # Фасеты: группировка читается из индекса по порядку, без таблицы
+            models.Index(fields=['producer', 'manufacturer', 'category'], name='product_facets_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.search_document = build_search_document(self, self.producer.name, self.manufacturer.name)
+        self.final_price = compute_final_price(self.price, self.discount)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # updated_at входит в ключ кэша карточки товара
+            kwargs['update_fields'] = {*update_fields, 'search_document', 'final_price', 'updated_at'}
+        super().save(*args, **kwargs)
 
     # Получение стоимости, где включена скидка
     def get_final_price(self):
@@ -39,6 +165,18 @@ class Product(models.Model):
             return self.price * (100 - self.discount) / 100
         return self.price
 
+class ImageBlob(models.Model):
+    # Счетчик ссылок товаров на файл в ContentAddressedStorage
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.PositiveIntegerField(default=0)
+
+class StockReservation(models.Model):
+    # Списание остатков по заказу (examapp.stock). Уникальный ключ делает
+    # повторное списание по тому же заказу безопасным
+    key = models.CharField(max_length=255, unique=True)
+    lines = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
 class Order(models.Model):
     number_order = models.DecimalField(max_digits=10, decimal_places=2)
     arcticle = models.CharField(max_length=255)
@@ -48,4 +186,28 @@ class Order(models.Model):
     pvz = models.ForeignKey(Pvz, on_delete=models.CASCADE)
     client = models.ForeignKey(User, on_delete=models.CASCADE)
     code = models.DecimalField(max_digits=10, decimal_places=2)
-    status = models.ForeignKey(StatusOrder, on_delete=models.CASCADE)
\ No newline at end of file
+    status = models.ForeignKey(StatusOrder, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['client', 'date_order'], name='order_client_date_idx'),
+            models.Index(fields=['status', 'date_order'], name='order_status_date_idx'),
+            models.Index(fields=['date_order'], name='order_date_idx'),
+            # Выдача в пункте: поиск по коду получения внутри пункта и по номеру заказа
+            models.Index(fields=['pvz', 'code'], name='order_pvz_code_idx'),
+            models.Index(fields=['number_order'], name='order_number_idx'),
+        ]
+
+# Сводные таблицы по заказам. Обновляются инкрементально сигналами
+# (examapp.orderstats), полностью пересчитываются командой rebuild_order_stats
+class OrderStatusSummary(models.Model):
+    status = models.OneToOneField(StatusOrder, on_delete=models.CASCADE)
+    orders = models.IntegerField(default=0)
+
+class OrderPvzSummary(models.Model):
+    pvz = models.OneToOneField(Pvz, on_delete=models.CASCADE)
+    orders = models.IntegerField(default=0)
+
+class OrderDeliverySummary(models.Model):
+    date_delivery = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
@@ -0,0 +1,49 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import OrderDeliverySummary, OrderPvzSummary, OrderStatusSummary
+
+# Сводная таблица и поле заказа, по которому она группируется
+SUMMARIES = (
+    (OrderStatusSummary, 'status_id'),
+    (OrderPvzSummary, 'pvz_id'),
+    (OrderDeliverySummary, 'date_delivery'),
+)
+EMPTY_KEY = (None,) * len(SUMMARIES)
+
+
+def summary_key(order):
+    # Без обращения к дескрипторам, чтобы не загружать отложенные поля
+    return tuple(order.__dict__.get(field) for _, field in SUMMARIES)
+
+
+def add_to_summary(model, field, value, delta):
+    if value is None or not delta:
+        return
+    with transaction.atomic():
+        if not model.objects.filter(**{field: value}).update(orders=F('orders') + delta):
+            try:
+                with transaction.atomic():
+                    model.objects.create(**{field: value, 'orders': delta})
+            except IntegrityError:
+                model.objects.filter(**{field: value}).update(orders=F('orders') + delta)
+
+
+def apply_order_change(old_key, new_key):
+    """
+    Перенос заказа между строками сводных таблиц: -1 по старому значению
+    и +1 по новому для каждого изменившегося измерения.
+    """
+    with transaction.atomic():
+        for (model, field), old, new in zip(SUMMARIES, old_key, new_key):
+            if old != new:
+                add_to_summary(model, field, old, -1)
+                add_to_summary(model, field, new, 1)
+
+
+def apply_summary_deltas(model, field, deltas):
+    with transaction.atomic():
+        for value, delta in Counter(deltas).items():
+            add_to_summary(model, field, value, delta)
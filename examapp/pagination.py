@@ -0,0 +1,123 @@
+import base64
+import binascii
+import json
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'d': direction, 'k': [str(v) if isinstance(v, Decimal) else v for v in values]},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        direction, values = data['d'], data['k']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursor(cursor)
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return direction, values
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод по ключу сортировки (keyset / cursor pagination).
+    Вместо OFFSET запоминаются значения полей сортировки последней строки,
+    поэтому стоимость запроса не зависит от номера страницы.
+    Последним полем сортировки должен быть уникальный ключ (обычно 'id').
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.ordering = [(f.lstrip('-'), f.startswith('-')) for f in ordering]
+        self.page_size = page_size
+
+    def _order_by(self, reverse):
+        return [f'-{name}' if desc != reverse else name for name, desc in self.ordering]
+
+    def _after(self, values, reverse):
+        # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y)
+        condition = Q()
+        for i, (name, desc) in enumerate(self.ordering):
+            lookup = 'lt' if desc != reverse else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[i]})
+            for j, (prev_name, _) in enumerate(self.ordering[:i]):
+                term &= Q(**{prev_name: values[j]})
+            condition |= term
+        return condition
+
+    def _output_field(self, name):
+        try:
+            return self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Поле сортировки - аннотация (например, search_rank)
+            return self.queryset.query.annotations[name].output_field
+
+    def _clean_values(self, values, cursor):
+        # Значения курсора приходят от клиента: приводятся к типам полей
+        # сортировки, иначе некорректное значение дошло бы до ORM
+        if len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+        cleaned = []
+        for value, (name, _) in zip(values, self.ordering):
+            try:
+                value = self._output_field(name).to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise InvalidCursor(cursor)
+            if value is None:
+                raise InvalidCursor(cursor)
+            cleaned.append(value)
+        return cleaned
+
+    def _key(self, obj):
+        return [getattr(obj, name) for name, _ in self.ordering]
+
+    def page_queryset(self, values=None, reverse=False):
+        # Запрос одной страницы (на строку больше, чтобы узнать о следующей)
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse))
+        return queryset.order_by(*self._order_by(reverse))[:self.page_size + 1]
+
+    def page(self, cursor=None):
+        direction, values = decode_cursor(cursor) if cursor else ('next', None)
+        if values is not None:
+            values = self._clean_values(values, cursor)
+        reverse = direction == 'prev'
+
+        rows = list(self.page_queryset(values, reverse))
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        has_next = has_more if not reverse else True
+        has_prev = has_more if reverse else values is not None
+        return Page(
+            rows,
+            encode_cursor(self._key(rows[-1]), 'next') if rows and has_next else None,
+            encode_cursor(self._key(rows[0]), 'prev') if rows and has_prev else None,
+        )
+
+
+class Page:
+    def __init__(self, object_list, next_cursor, prev_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
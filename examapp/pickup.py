@@ -0,0 +1,77 @@
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .dimensions import dimension_cache
+from .models import Order, OrderStatusSummary, StatusOrder
+from .orderstats import apply_summary_deltas, summary_key
+
+
+def parse_codes(values):
+    """
+    Разбор кодов получения: (коды Decimal, нераспознанные строки).
+    """
+    codes, invalid = {}, []
+    for value in values:
+        value = str(value).strip()
+        try:
+            code = Decimal(value)
+        except InvalidOperation:
+            invalid.append(value)
+            continue
+        if code.is_finite():
+            codes[code] = value
+        else:
+            invalid.append(value)
+    return codes, invalid
+
+
+def pvz_orders(pvz_id, codes):
+    # Индекс (pvz, code): поиск по коду внутри пункта выдачи. Без
+    # сортировки, чтобы план не добавлял ее поверх индекса
+    return Order.objects.select_related('client', 'status').filter(pvz_id=pvz_id, code__in=codes)
+
+
+def get_issued_status():
+    for status in dimension_cache.table(StatusOrder).values():
+        if status.name == settings.ORDER_ISSUED_STATUS:
+            return status
+    return StatusOrder.objects.get_or_create(name=settings.ORDER_ISSUED_STATUS)[0]
+
+
+def issue_orders(pvz_id, values):
+    """
+    Выдача заказов пункта выдачи по списку кодов: статус всех найденных
+    заказов меняется одним UPDATE, сводная таблица статусов - одним
+    изменением на статус. Возвращает словарь со списками выданных, уже
+    выданных заказов и кодов, по которым ничего не найдено.
+    """
+    codes, invalid = parse_codes(values)
+    issued_status = get_issued_status()
+    with transaction.atomic():
+        orders = pvz_orders(pvz_id, codes)
+        if connection.features.has_select_for_update_of:
+            # Блокируются только строки заказов, не клиенты и не статусы
+            orders = orders.select_for_update(of=('self',))
+        orders = list(orders)
+        to_issue = [order for order in orders if order.status_id != issued_status.id]
+        if to_issue:
+            # Массовый UPDATE не вызывает сигналы, поэтому сводная таблица
+            # статусов пересчитывается здесь
+            Order.objects.filter(id__in=[order.id for order in to_issue]).update(status=issued_status)
+            deltas = Counter({issued_status.id: len(to_issue)})
+            deltas.subtract(order.status_id for order in to_issue)
+            apply_summary_deltas(OrderStatusSummary, 'status_id', deltas)
+    for order in to_issue:
+        order.status = issued_status
+        order._summary_key = summary_key(order)
+
+    issued_ids = {order.id for order in to_issue}
+    found = {order.code for order in orders}
+    return {
+        'issued': to_issue,
+        'already_issued': [order for order in orders if order.id not in issued_ids],
+        'not_found': invalid + [value for code, value in codes.items() if code not in found],
+    }
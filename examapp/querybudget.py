@@ -0,0 +1,120 @@
+import contextvars
+import functools
+import logging
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+
+WRITE_STATEMENTS = {'INSERT', 'UPDATE', 'DELETE'}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries):
+    """
+    Объявление максимального числа SQL-запросов для представления.
+    Число запросов считается на каждом вызове; при превышении в режиме
+    QUERY_BUDGET_STRICT выбрасывается QueryBudgetExceeded, иначе пишется
+    предупреждение в лог. Декоратор ставится самым внешним, чтобы учитывать
+    и запросы login_required (сессия, пользователь). Подходит и для
+    асинхронных представлений: учитываются запросы из всех потоков,
+    запущенных через sync_to_async.
+    """
+    def check(view_func, counter):
+        if counter.count > max_queries:
+            message = (f"Представление {view_func.__name__} выполнило {counter.count} запросов "
+                       f"при бюджете {max_queries}")
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @functools.wraps(view_func)
+            async def wrapper(request, *args, **kwargs):
+                with track_queries(QueryCounter()) as counter:
+                    response = await view_func(request, *args, **kwargs)
+                check(view_func, counter)
+                return response
+        else:
+            @functools.wraps(view_func)
+            def wrapper(request, *args, **kwargs):
+                with track_queries(QueryCounter()) as counter:
+                    response = view_func(request, *args, **kwargs)
+                check(view_func, counter)
+                return response
+
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
+
+
+_query_observers = contextvars.ContextVar('query_observers', default=())
+
+
+@contextmanager
+def track_queries(observer):
+    """
+    Подключение наблюдателя (execute wrapper) ко всем запросам текущего
+    контекста. В отличие от connection.execute_wrapper наблюдатель видит и
+    запросы из других потоков и соединений: sync_to_async копирует контекст.
+    """
+    token = _query_observers.set((*_query_observers.get(), observer))
+    try:
+        yield observer
+    finally:
+        _query_observers.reset(token)
+
+
+def _dispatch_to_observers(execute, sql, params, many, context):
+    for observer in reversed(_query_observers.get()):
+        execute = functools.partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install_query_tracking(connection):
+    # Вызывается при каждом новом соединении. Обертка ставится первой:
+    # connection.execute_wrapper снимает свои обертки с конца
+    if _dispatch_to_observers not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _dispatch_to_observers)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        self.statements.append(sql)
+        return execute(sql, params, many, context)
+
+    @property
+    def writes(self):
+        return sum(1 for sql in self.statements if sql.lstrip().split(None, 1)[0].upper() in WRITE_STATEMENTS)
+
+
+class QueryBudgetTestMixin:
+    """
+    Проверка в тестах, что запрос к URL укладывается в бюджет,
+    объявленный у представления через @query_budget.
+    """
+
+    def assertWithinQueryBudget(self, url, data=None):
+        budget = getattr(resolve(url).func, 'query_budget', None)
+        if budget is None:
+            self.fail(f"У представления для {url} не объявлен @query_budget")
+        with track_queries(QueryCounter()) as queries:
+            response = self.client.get(url, data)
+        if queries.count > budget:
+            self.fail(f"{url}: {queries.count} запросов при бюджете {budget}:\n"
+                      + '\n'.join(queries.statements))
+        return response
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Роли в порядке приоритета при входе: роль -> группа пользователя.
+# Имя роли совпадает с именем URL ее страницы
+ROLE_GROUPS = (
+    ('admin', 'Администратор'),
+    ('client', 'Авторизованный клиент'),
+    ('manager', 'Менеджер'),
+)
+
+
+def user_groups_cache_key(user_id):
+    return f'user-groups:{user_id}'
+
+
+def get_user_group_names(user):
+    """
+    Названия групп пользователя. Запоминаются на объекте пользователя
+    (он живет один запрос) и в общем кэше между запросами; кэш
+    сбрасывается сигналами при изменении состава групп.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    names = getattr(user, '_group_names', None)
+    if names is None:
+        key = user_groups_cache_key(user.pk)
+        names = cache.get(key)
+        if names is None:
+            names = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, names, settings.USER_GROUPS_CACHE_TIMEOUT)
+        user._group_names = names
+    return names
+
+
+def get_user_role(user):
+    names = get_user_group_names(user)
+    for role, group_name in ROLE_GROUPS:
+        if group_name in names:
+            return role
+    return None
+
+
+def invalidate_user_groups(user_ids):
+    # Ключи удаляются после фиксации: запрос, прочитавший группы до COMMIT,
+    # иначе снова закэшировал бы старый состав на USER_GROUPS_CACHE_TIMEOUT
+    keys = [user_groups_cache_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
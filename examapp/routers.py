@@ -0,0 +1,119 @@
+import contextvars
+import functools
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_ALIAS = 'replica'
+# Модели этих приложений можно читать с реплики. Сессии и пользователи
+# всегда читаются с основной базы: их пишут при входе, и отставание
+# реплики разлогинило бы пользователя
+REPLICA_APPS = {'examapp'}
+# Cookie, закрепляющий клиента за основной базой после записи
+PIN_COOKIE = 'db_primary'
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+_write_log = contextvars.ContextVar('replica_write_log', default=None)
+_read_log = contextvars.ContextVar('replica_read_log', default=None)
+
+
+class WriteLog:
+    def __init__(self):
+        self.wrote = False
+
+
+class ReadLog:
+    def __init__(self):
+        self.used_replica = False
+
+
+@contextmanager
+def record_writes():
+    log = WriteLog()
+    token = _write_log.set(log)
+    try:
+        yield log
+    finally:
+        _write_log.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    # Данные, которые кэшируются под текущей версией каталога, читаются с
+    # основной базы: реплика могла еще не применить эту версию
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_used():
+    log = _read_log.get()
+    return log is not None and log.used_replica
+
+
+def replica_enabled(request):
+    return (settings.REPLICA_READS and REPLICA_ALIAS in settings.DATABASES
+            and PIN_COOKIE not in request.COOKIES)
+
+
+def replica_reads(view_func):
+    """
+    Чтение каталога в представлении идет с реплики, если она настроена и
+    клиент не закреплен за основной базой после недавней записи.
+    """
+    if iscoroutinefunction(view_func):
+        @functools.wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            token = _replica_reads.set(replica_enabled(request))
+            log_token = _read_log.set(ReadLog())
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                _read_log.reset(log_token)
+                _replica_reads.reset(token)
+    else:
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            token = _replica_reads.set(replica_enabled(request))
+            log_token = _read_log.set(ReadLog())
+            try:
+                return view_func(request, *args, **kwargs)
+            finally:
+                _read_log.reset(log_token)
+                _replica_reads.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Запись всегда идет в основную базу. Чтение моделей каталога уходит на
+    реплику только внутри replica_reads, вне транзакции основной базы и
+    если в текущем запросе еще не было записи в каталог.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or model._meta.app_label not in REPLICA_APPS:
+            return None
+        log = _write_log.get()
+        if (log is not None and log.wrote) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        read_log = _read_log.get()
+        if read_log is not None:
+            read_log.used_replica = True
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        log = _write_log.get()
+        if log is not None and model._meta.app_label in REPLICA_APPS:
+            log.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На реплике те же данные, что и в основной базе
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_ALIAS}:
+            return True
+        return None
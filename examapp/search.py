@@ -0,0 +1,81 @@
+import re
+
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+# Вес точного совпадения артикула заведомо больше любой текстовой релевантности
+ARTICLE_EXACT_BOOST = 100.0
+PRODUCT_PREFIX_BOOST = 10.0
+
+
+def normalize(text):
+    return re.sub(r'\s+', ' ', str(text or '').lower().replace('ё', 'е')).strip()
+
+
+def build_search_document(product, producer_name, manufacturer_name):
+    """
+    Поисковый документ товара: нормализованная склейка полей, по которым
+    раньше шел поиск через icontains, включая названия поставщика и
+    производителя, чтобы поиск не требовал join.
+    """
+    return normalize(' '.join((product.product, product.article, product.description,
+                               producer_name, manufacturer_name)))
+
+
+def fill_search_documents(products):
+    """
+    Заполнение search_document для пачки товаров: названия справочников
+    загружаются одним запросом на справочник, а не по запросу на товар.
+    """
+    from .models import Manufacturer, Producer
+
+    products = list(products)
+    producers = dict(Producer.objects.filter(id__in={p.producer_id for p in products}).values_list('id', 'name'))
+    manufacturers = dict(Manufacturer.objects.filter(
+        id__in={p.manufacturer_id for p in products}).values_list('id', 'name'))
+    for product in products:
+        product.search_document = build_search_document(
+            product, producers.get(product.producer_id, ''), manufacturers.get(product.manufacturer_id, ''))
+    return products
+
+
+def refresh_search_documents(queryset, batch_size=1000):
+    """
+    Пересчет search_document для товаров из queryset (например, после
+    переименования поставщика или производителя).
+    """
+    from .models import Product
+
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not batch:
+            return
+        Product.objects.bulk_update(batch, ['search_document'])
+        last_id = batch[-1].id
+
+
+def search_products(queryset, query):
+    """
+    Фильтрация товаров по поисковому запросу с аннотацией search_rank.
+    Каждое слово запроса должно встречаться в search_document. На PostgreSQL
+    условие обслуживается триграммным GIN-индексом, а к рангу добавляется
+    триграммная похожесть; на остальных СУБД ранг считается только по
+    совпадению артикула и началу названия.
+    """
+    query = normalize(query)
+    condition = Q()
+    for term in query.split(' '):
+        condition &= Q(search_document__contains=term)
+
+    rank = Case(
+        When(article__iexact=query, then=Value(ARTICLE_EXACT_BOOST)),
+        When(product__istartswith=query, then=Value(PRODUCT_PREFIX_BOOST)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    if connections[queryset.db].vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        rank = rank + TrigramWordSimilarity(Value(query), F('search_document'))
+    return queryset.filter(condition).annotate(search_rank=rank)
@@ -0,0 +1,139 @@
+from django.contrib.auth.models import Group, User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .autocomplete import advance_product_index, product_index
+from .caching import bump_catalog_version, bump_dimensions_version
+from .dimensions import DIMENSIONS
+from .models import CategoryProduct, Manufacturer, Order, Producer, Product
+from .orderstats import EMPTY_KEY, apply_order_change, summary_key
+from .querybudget import install_query_tracking
+from .roles import invalidate_user_groups
+from .search import refresh_search_documents
+from .storage import acquire_image, release_image
+
+
+@receiver(post_save, sender=Producer)
+def refresh_producer_products(sender, instance, created, **kwargs):
+    if not created:
+        refresh_search_documents(Product.objects.filter(producer=instance))
+
+
+@receiver(post_save, sender=Manufacturer)
+def refresh_manufacturer_products(sender, instance, created, **kwargs):
+    if not created:
+        refresh_search_documents(Product.objects.filter(manufacturer=instance))
+
+
+@receiver(post_save, sender=CategoryProduct)
+def touch_category_products(sender, instance, created, **kwargs):
+    # Название категории выводится в карточке товара
+    if not created:
+        Product.objects.filter(category=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Producer)
+@receiver(post_delete, sender=Producer)
+@receiver(post_save, sender=Manufacturer)
+@receiver(post_delete, sender=Manufacturer)
+@receiver(post_save, sender=CategoryProduct)
+@receiver(post_delete, sender=CategoryProduct)
+def bump_version_on_dimension_change(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_dimension_cache(sender, **kwargs):
+    if sender in DIMENSIONS:
+        bump_dimensions_version()
+
+
+def change_product_index(change):
+    # Индекс меняется только после фиксации: при откате транзакции в нем
+    # не должно остаться записи, которой нет в БД
+    def after_commit(version, committed):
+        if product_index.built:
+            change()
+        advance_product_index(version, committed)
+
+    bump_catalog_version(on_commit=after_commit)
+
+
+@receiver(post_save, sender=Product)
+def update_product_index(sender, instance, **kwargs):
+    product_id, name, article = instance.id, instance.product, instance.article
+    change_product_index(lambda: product_index.update(product_id, name, article))
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_product_index(sender, instance, **kwargs):
+    product_id = instance.id
+    change_product_index(lambda: product_index.remove(product_id))
+
+
+def _image_name(instance):
+    # Без обращения к дескриптору, чтобы не загружать отложенное поле
+    value = instance.__dict__.get('image')
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Product)
+def remember_stored_image(sender, instance, **kwargs):
+    instance._stored_image = _image_name(instance)
+
+
+@receiver(post_save, sender=Product)
+def count_image_references(sender, instance, **kwargs):
+    name = _image_name(instance)
+    if name != instance._stored_image:
+        acquire_image(name)
+        release_image(instance._stored_image)
+        instance._stored_image = name
+
+
+@receiver(post_delete, sender=Product)
+def release_deleted_image(sender, instance, **kwargs):
+    release_image(_image_name(instance))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_groups_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_user_groups([instance.pk])
+    elif action == 'pre_clear':
+        # После очистки пользователей группы уже не найти
+        invalidate_user_groups(instance.user_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_user_groups(pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_groups_on_group_change(sender, instance, **kwargs):
+    invalidate_user_groups(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(connection_created)
+def track_connection_queries(sender, connection, **kwargs):
+    install_query_tracking(connection)
+
+
+@receiver(post_init, sender=Order)
+def remember_order_summary_key(sender, instance, **kwargs):
+    instance._summary_key = summary_key(instance)
+
+
+@receiver(post_save, sender=Order)
+def update_order_summaries(sender, instance, created, **kwargs):
+    new_key = summary_key(instance)
+    apply_order_change(EMPTY_KEY if created else instance._summary_key, new_key)
+    instance._summary_key = new_key
+
+
+@receiver(post_delete, sender=Order)
+def remove_from_order_summaries(sender, instance, **kwargs):
+    apply_order_change(summary_key(instance), EMPTY_KEY)
@@ -0,0 +1,118 @@
+from collections import Counter
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, When
+
+from .models import Product, StockReservation
+
+
+class InsufficientStock(Exception):
+    def __init__(self, articles):
+        self.articles = sorted(articles)
+        super().__init__(f"Недостаточно остатков по артикулам: {', '.join(self.articles)}")
+
+
+class AmbiguousArticle(Exception):
+    def __init__(self, articles):
+        self.articles = sorted(articles)
+        super().__init__(f"Несколько товаров с одним артикулом: {', '.join(self.articles)}")
+
+
+def order_reservation_key(number_order):
+    return f'order:{number_order}'
+
+
+def order_lines(orders):
+    """
+    Строки заказа {артикул: количество} из записей Order одного номера.
+    """
+    lines = Counter()
+    for order in orders:
+        lines[order.arcticle] += Decimal(order.amount_product)
+    return lines
+
+
+def _normalize(lines):
+    lines = Counter({article: Decimal(quantity) for article, quantity in dict(lines).items()})
+    if any(quantity <= 0 for quantity in lines.values()):
+        raise ValueError("Количество в строке заказа должно быть положительным")
+    return lines
+
+
+def _shift_stock(lines, sign):
+    # Один UPDATE на все строки заказа: CASE по артикулу задает новое
+    # значение, а условие amount_on_warehouse >= количество не дает уйти
+    # в минус. СУБД проверяет условие по актуальной версии строки, поэтому
+    # параллельные списания не теряются и не продают лишнего
+    delta = {article: sign * quantity for article, quantity in lines.items()}
+    queryset = Product.objects.filter(article__in=lines)
+    if sign < 0:
+        queryset = queryset.filter(reduce(or_, (Q(article=article, amount_on_warehouse__gte=quantity)
+                                                for article, quantity in lines.items())))
+    return queryset.update(amount_on_warehouse=Case(
+        *(When(article=article, then=F('amount_on_warehouse') + value) for article, value in delta.items()),
+        default=F('amount_on_warehouse'),
+    ))
+
+
+def _match_products(lines):
+    # Артикул не уникален: если ему соответствует несколько товаров,
+    # UPDATE изменил бы остатки всех, поэтому такие строки отклоняются.
+    # Несколько строк блокируются заранее в порядке id: иначе два заказа
+    # с одними товарами могут заблокировать их в разном порядке и получить
+    # взаимоблокировку. Для одной строки достаточно блокировки, которую
+    # берет сам UPDATE
+    queryset = Product.objects.filter(article__in=lines).order_by('id')
+    if len(lines) > 1:
+        queryset = queryset.select_for_update()
+    matched = Counter(queryset.values_list('article', flat=True))
+    ambiguous = {article for article, count in matched.items() if count > 1}
+    if ambiguous:
+        raise AmbiguousArticle(ambiguous)
+
+
+def reserve_stock(key, lines):
+    """
+    Списание остатков по строкам {артикул: количество} одним запросом.
+    Повторный вызов с тем же ключом ничего не делает и возвращает False.
+    Если хотя бы одной позиции не хватает, не списывается ничего и
+    выбрасывается InsufficientStock; если артикулу соответствует несколько
+    товаров - AmbiguousArticle.
+    """
+    lines = _normalize(lines)
+    if not lines:
+        return False
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                StockReservation.objects.create(key=key, lines={a: str(q) for a, q in lines.items()})
+        except IntegrityError:
+            return False
+
+        _match_products(lines)
+        updated = _shift_stock(lines, -1)
+        if updated != len(lines):
+            available = set(Product.objects.filter(
+                reduce(or_, (Q(article=article, amount_on_warehouse__gte=quantity)
+                             for article, quantity in lines.items()))).values_list('article', flat=True))
+            raise InsufficientStock(set(lines) - available)
+    return True
+
+
+def release_stock(key):
+    """
+    Возврат остатков по ранее сделанному списанию (отмена заказа).
+    Повторный вызов ничего не делает.
+    """
+    with transaction.atomic():
+        reservation = StockReservation.objects.select_for_update().filter(key=key).first()
+        if reservation is None:
+            return False
+        lines = _normalize(reservation.lines)
+        _match_products(lines)
+        _shift_stock(lines, 1)
+        reservation.delete()
+    return True
@@ -0,0 +1,86 @@
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.[\w]+)?$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла - это SHA-256 его содержимого:
+    <upload_to>/ab/abcdef...png. Одинаковые загрузки попадают в один и тот
+    же файл, а повторная загрузка не пишет на диск ничего. Хэш считается
+    по частям (chunks), файл целиком в память не читается.
+    """
+
+    hash_chunk_size = 64 * 1024
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks(self.hash_chunk_size):
+            digest.update(chunk)
+        content.seek(0)
+
+        hexdigest = digest.hexdigest()
+        ext = os.path.splitext(name)[1].lower()
+        name = posixpath.join(posixpath.dirname(name.replace('\\', '/')), hexdigest[:2], hexdigest + ext)
+        if self.exists(name):
+            return name
+        return self._save(name, content).replace('\\', '/')
+
+    @staticmethod
+    def is_content_addressed(name):
+        return bool(name and HASHED_NAME_RE.search(name))
+
+
+def get_product_image_storage():
+    return product_image_storage
+
+
+product_image_storage = ContentAddressedStorage()
+
+
+def acquire_image(name, count=1):
+    from .models import ImageBlob
+
+    if not ContentAddressedStorage.is_content_addressed(name):
+        return
+    with transaction.atomic():
+        if not ImageBlob.objects.filter(name=name).update(refcount=F('refcount') + count):
+            try:
+                with transaction.atomic():
+                    ImageBlob.objects.create(name=name, refcount=count)
+            except IntegrityError:
+                ImageBlob.objects.filter(name=name).update(refcount=F('refcount') + count)
+
+
+def release_image(name):
+    """
+    Уменьшение счетчика ссылок; файл удаляется после фиксации транзакции,
+    когда на него больше не ссылается ни один товар.
+    """
+    from .models import ImageBlob
+
+    if not ContentAddressedStorage.is_content_addressed(name):
+        return
+    with transaction.atomic():
+        ImageBlob.objects.filter(name=name).update(refcount=F('refcount') - 1)
+        deleted, _ = ImageBlob.objects.filter(name=name, refcount__lte=0).delete()
+    if deleted:
+        transaction.on_commit(lambda: _delete_if_unreferenced(name))
+
+
+def _delete_if_unreferenced(name):
+    from .models import ImageBlob
+
+    # Файл мог снова понадобиться, пока транзакция фиксировалась
+    if not ImageBlob.objects.filter(name=name).exists():
+        product_image_storage.delete(name)
@@ -0,0 +1,35 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+CARD_TEMPLATE = 'product_card.html'
+
+
+def card_cache_key(product, template_name=CARD_TEMPLATE):
+    return f'product-card:{template_name}:{product.id}:{product.updated_at.timestamp()}'
+
+
+@register.simple_tag
+def cached_product_cards(products):
+    """
+    Пары (товар, html карточки). Карточки берутся из кэша одним get_many
+    на страницу; ключ включает updated_at, поэтому изменение товара
+    автоматически дает новый ключ. Отрисовываются только промахи.
+    """
+    products = list(products)
+    keys = {product.id: card_cache_key(product) for product in products}
+    cached = cache.get_many(keys.values())
+
+    missing = {}
+    card_template = get_template(CARD_TEMPLATE)
+    for product in products:
+        if keys[product.id] not in cached:
+            missing[keys[product.id]] = card_template.render({'product': product})
+    if missing:
+        cache.set_many(missing, settings.PRODUCT_CARD_CACHE_TIMEOUT)
+        cached.update(missing)
+    return [(product, mark_safe(cached[keys[product.id]])) for product in products]
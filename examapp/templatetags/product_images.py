@@ -0,0 +1,31 @@
+from django import template
+from django.conf import settings
+from django.utils.html import format_html
+
+from examapp.thumbnails import derivative_name, derivatives_ready
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_image(product):
+    """
+    Картинка карточки товара из заранее подготовленных миниатюр (WebP и
+    JPEG через srcset). Пока миниатюры не готовы, выводится заглушка.
+    """
+    width, height = settings.THUMBNAIL_SIZES[0]
+    name = product.image.name
+    storage = product.image.storage
+    if not name or not derivatives_ready(name, storage):
+        return format_html('<img src="{}" width="{}" height="{}" alt="{}">',
+                           settings.MEDIA_URL + settings.THUMBNAIL_PLACEHOLDER, width, height, product.product)
+
+    def srcset(ext):
+        return ', '.join(f'{storage.url(derivative_name(name, w, ext))} {w}w' for w, _ in settings.THUMBNAIL_SIZES)
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}px">'
+        '<img src="{}" srcset="{}" sizes="{}px" width="{}" height="{}" alt="{}" loading="lazy"></picture>',
+        srcset('webp'), width, storage.url(derivative_name(name, width, 'jpg')), srcset('jpg'),
+        width, width, height, product.product,
+    )
@@ -1,7 +1,49 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipIf, skipUnless
+from datetime import date
+from decimal import Decimal
+
 from django.contrib.auth.models import User, Group
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from asgiref.sync import async_to_sync
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.templatetags.static import static
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from .models import Producer
+from PIL import Image
+from . import async_views
+from .assets import IMMUTABLE_CACHE_CONTROL, StaticFiles, StaticFilesASGI, StaticFilesWSGI
+from .autocomplete import get_product_index, load_product_index, product_index
+from .caching import VersionedLRUCache, bump_catalog_version, get_catalog_version, listing_cache
+from .dimensions import attach_dimensions, dimension_cache, dimension_list
+from .metrics import registry
+from .middleware import PrimaryPinMiddleware
+from .models import (Producer, Manufacturer, CategoryProduct, Product, ImageBlob, Order, Pvz, StatusOrder,
+                     OrderStatusSummary, OrderPvzSummary, OrderDeliverySummary)
+from .pagination import encode_cursor
+from .querybudget import QueryBudgetExceeded, QueryBudgetTestMixin, QueryCounter, query_budget, track_queries
+from .roles import get_user_role, user_groups_cache_key
+from .routers import PIN_COOKIE, REPLICA_ALIAS
+from .stock import AmbiguousArticle, InsufficientStock, release_stock, reserve_stock
+from .templatetags.product_cards import cached_product_cards, card_cache_key
+from .templatetags.product_images import product_image
+from .thumbnails import derivative_name, derivative_targets, render_derivatives, schedule_derivatives
+from .views import check_group_access
 
 
 class ProductListViewTest(TestCase):
@@ -49,3 +91,1437 @@ class ProductListViewTest(TestCase):
         response = self.client.get(producer_url)
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "1")
+
+
+def create_products(count, **kwargs):
+    """
+    Создание набора товаров со справочниками для тестов списков.
+    """
+    producer = Producer.objects.create(name=kwargs.pop('producer_name', 'Поставщик'))
+    manufacturer = Manufacturer.objects.create(name='Производитель')
+    category = CategoryProduct.objects.create(name='Категория')
+    return [
+        Product.objects.create(
+            article=f'A{i:05d}', product=f'Товар {i}', unit='шт.', price=100,
+            producer=producer, manufacturer=manufacturer, category=category,
+            discount=0, amount_on_warehouse=i % 7, description='Описание',
+            image='stub.jpg', **kwargs,
+        )
+        for i in range(count)
+    ]
+
+
+class CatalogUserMixin:
+    """
+    Пользователь test/Test1234 для тестов каталога. Перед его созданием
+    очищаются кэши, от которых зависит число запросов в тестах.
+    """
+
+    def login_user(self, *groups, login=True):
+        cache.clear()
+        listing_cache.clear()
+        dimension_cache.clear()
+        product_index.built = False
+        self.user = User.objects.create_user(username='test', password='Test1234')
+        for name in groups:
+            self.user.groups.add(Group.objects.get_or_create(name=name)[0])
+        if login:
+            self.client.login(username='test', password='Test1234')
+        return self.user
+
+
+@override_settings(PRODUCTS_PAGE_SIZE=5)
+class ProductPaginationTest(CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Подготовка менеджера и каталога из нескольких страниц товаров.
+        """
+        self.login_user('Менеджер')
+        self.products = create_products(17)
+
+    def walk(self, params):
+        """
+        Обход всех страниц вперед по курсору next_cursor.
+        """
+        pages = []
+        response = self.client.get(reverse('manager'), params)
+        while True:
+            pages.append([p.id for p in response.context['products']])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                return pages, response
+            response = self.client.get(reverse('manager'), {**params, 'cursor': cursor})
+
+    def test_pages_cover_catalog_in_sort_order(self):
+        """
+        Страницы по курсору не теряют и не дублируют товары и сохраняют
+        порядок сортировки по количеству на складе.
+        """
+        pages, _ = self.walk({'sort': 'amount_desc'})
+        ids = [pk for page in pages for pk in page]
+        expected = [p.id for p in sorted(self.products, key=lambda p: (-p.amount_on_warehouse, -p.id))]
+        self.assertEqual(ids, expected)
+        self.assertEqual([len(page) for page in pages], [5, 5, 5, 2])
+
+    def test_prev_cursor_returns_previous_page(self):
+        """
+        Курсор prev_cursor возвращает ровно предыдущую страницу,
+        а на первой странице его нет.
+        """
+        first = self.client.get(reverse('manager'), {'sort': 'amount_asc'})
+        self.assertIsNone(first.context['prev_cursor'])
+        second = self.client.get(reverse('manager'), {'sort': 'amount_asc', 'cursor': first.context['next_cursor']})
+        back = self.client.get(reverse('manager'), {'sort': 'amount_asc', 'cursor': second.context['prev_cursor']})
+        self.assertEqual([p.id for p in back.context['products']], [p.id for p in first.context['products']])
+        self.assertEqual(back.context['total_products'], 17)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        """
+        Поврежденный курсор не приводит к ошибке сервера.
+        """
+        response = self.client.get(reverse('manager'), {'cursor': 'garbage!'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['products']), 5)
+
+    def test_cursor_values_of_wrong_type(self):
+        """
+        Курсор правильной формы, но со значениями не того типа, тоже
+        приводит к первой странице, а не к ошибке сервера.
+        """
+        for params, values in (({'sort': 'amount_asc'}, ['x', 1]), ({}, [{'a': 1}]), ({}, [None]),
+                               ({'sort': 'price_desc'}, [[1], 2]), ({}, ['1.5']),
+                               ({'search': 'товар'}, ['x', 1])):
+            with self.subTest(params=params, values=values):
+                cursor = encode_cursor(values, 'next')
+                response = self.client.get(reverse('manager'), {**params, 'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['products']), 5)
+
+    def test_invalid_producer_ignored(self):
+        """
+        Фильтр по поставщику с нецифровым (по isdigit проходит '²') или не
+        помещающимся в bigint id игнорируется, а не приводит к ошибке.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(Group.objects.get_or_create(name='Администратор')[0])
+        for producer in ('²', '99999999999999999999999', '9223372036854775808', '-1', '0', '١'):
+            for name in ('manager', 'admin', 'export_products'):
+                with self.subTest(producer=producer, view=name):
+                    response = self.client.get(reverse(name), {'producer': producer})
+                    self.assertEqual(response.status_code, 200)
+                    if name != 'export_products':
+                        self.assertEqual(response.context['current_producer'], '')
+                        self.assertEqual(len(response.context['products']), 5)
+                    else:
+                        self.assertEqual(b''.join(response.streaming_content).decode().count('\n'), 18)
+        producer_id = self.products[0].producer_id
+        response = self.client.get(reverse('manager'), {'producer': f'0{producer_id}'})
+        self.assertEqual(response.context['current_producer'], str(producer_id))
+
+
+class ProductSearchTest(CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Подготовка менеджера и небольшого каталога для поиска.
+        """
+        self.login_user('Менеджер')
+        self.products = create_products(3, producer_name='Ёлка-Снаб')
+
+    def search(self, query):
+        response = self.client.get(reverse('manager'), {'search': query})
+        return [p.id for p in response.context['products']]
+
+    def test_search_document_is_maintained(self):
+        """
+        Поисковый документ заполняется при save(), при bulk_create и
+        пересчитывается при переименовании поставщика.
+        """
+        product = self.products[0]
+        self.assertIn('елка-снаб', product.search_document)
+        bulk = Product(article='BULK', product='Пакетный', unit='шт.', price=1, discount=0,
+                       amount_on_warehouse=1, description='', image='stub.jpg',
+                       producer=product.producer, manufacturer=product.manufacturer, category=product.category)
+        Product.objects.bulk_create([bulk])
+        self.assertIn('пакетный', Product.objects.get(article='BULK').search_document)
+        product.producer.name = 'Новый поставщик'
+        product.producer.save()
+        product.refresh_from_db()
+        self.assertIn('новый поставщик', product.search_document)
+        self.assertEqual(len(self.search('Новый поставщик')), 4)
+
+    def test_article_exact_match_ranked_first(self):
+        """
+        Точное совпадение артикула выводится первым, а слова запроса
+        ищутся независимо от регистра и порядка.
+        """
+        target = self.products[2]
+        self.products[0].description = target.article
+        self.products[0].save()
+        self.assertEqual(self.search(target.article.lower()), [target.id, self.products[0].id])
+        self.assertEqual(len(self.search('снаб ЁЛКА')), 3)
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        """
+        Сброс индекса автодополнения перед каждым тестом.
+        """
+        product_index.built = False
+        self.products = create_products(3)
+
+    def test_prefix_matches_without_queries(self):
+        """
+        Подсказки находятся по началу любого слова названия и по артикулу,
+        а после построения индекса запросы к БД не выполняются.
+        """
+        self.client.get(reverse('search'), {'q': 'x'})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('search'), {'q': 'тов'})
+        self.assertEqual(len(response.json()), 3)
+        by_article = self.client.get(reverse('search'), {'q': 'a00001'}).json()
+        self.assertEqual(by_article, [{'id': self.products[1].id, 'product': 'Товар 1', 'article': 'A00001'}])
+
+    def test_index_follows_save_and_delete(self):
+        """
+        Индекс обновляется сигналами сохранения и удаления товара после
+        фиксации транзакции и остается в версии каталога.
+        """
+        get_product_index()
+        product = self.products[0]
+        product.product = 'Дрель аккумуляторная'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual([r['id'] for r in product_index.search('акку', 10)], [product.id])
+        self.assertEqual(product_index.search('товар 0', 10), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(product_index.search('дрель', 10), [])
+        self.assertEqual(product_index.version, get_catalog_version())
+
+    def test_rolled_back_save_not_indexed(self):
+        """
+        Товар из откаченной транзакции не попадает в индекс, а индекс
+        отстает от версии каталога и будет перестроен.
+        """
+        get_product_index()
+        product = self.products[0]
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Product.objects.create(
+                    article='GHOST1', product='Призрак', unit='шт.', price=1, producer=product.producer,
+                    manufacturer=product.manufacturer, category=product.category, discount=0,
+                    amount_on_warehouse=1, description='Описание', image='stub.jpg',
+                )
+                raise RuntimeError
+        self.assertEqual(self.client.get(reverse('search'), {'q': 'приз'}).json(), [])
+        self.assertNotEqual(product_index.version, get_catalog_version())
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTest(QueryBudgetTestMixin, CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Каталог из нескольких десятков товаров: при N+1 число запросов
+        растет вместе с числом карточек и выходит за бюджет.
+        """
+        create_products(30)
+        self.login_user('Менеджер', 'Авторизованный клиент', 'Администратор')
+
+    def test_views_within_budget(self):
+        """
+        Все страницы каталога укладываются в объявленный бюджет запросов.
+        """
+        for name in ('home', 'client', 'manager', 'admin'):
+            with self.subTest(name):
+                response = self.assertWithinQueryBudget(reverse(name))
+                self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(reverse('manager'), {'search': 'товар', 'sort': 'amount_asc'})
+        self.assertWithinQueryBudget(reverse('search'), {'q': 'тов'})
+
+    def test_views_within_budget_with_cold_caches(self):
+        """
+        Бюджеты рассчитаны на первый запрос после сброса всех кэшей: групп
+        пользователя, списков, справочников и индекса автодополнения.
+        """
+        for name, data in (('home', None), ('client', None), ('manager', None), ('admin', None),
+                           ('search', {'q': 'тов'})):
+            with self.subTest(name):
+                cache.clear()
+                listing_cache.clear()
+                dimension_cache.clear()
+                product_index.built = False
+                self.assertWithinQueryBudget(reverse(name), data)
+
+    def test_strict_budget_raises(self):
+        """
+        В строгом режиме превышение бюджета приводит к ошибке.
+        """
+        view = query_budget(0)(lambda request: list(Producer.objects.all()))
+        with self.assertRaises(QueryBudgetExceeded):
+            view(None)
+
+
+class ListingCacheTest(CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Подготовка менеджера, каталога и пустого кэша списков.
+        """
+        self.login_user('Менеджер')
+        self.products = create_products(3)
+
+    def test_repeated_listing_served_from_cache(self):
+        """
+        Повторный запрос с теми же (после нормализации) параметрами не
+        выполняет запросов к товарам и поставщикам: страница и число
+        товаров берутся из кэша списков, поставщики - из кэша справочников.
+        """
+        self.client.get(reverse('manager'), {'search': 'Товар'})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('manager'), {'search': ' товар '})
+        self.assertFalse([q for q in queries if 'examapp_' in q['sql']])
+        self.assertEqual(listing_cache.stats()['hits'], 2)
+
+    def test_catalog_write_invalidates(self):
+        """
+        Запись в товары или справочники меняет версию каталога, и
+        устаревший результат больше не отдается.
+        """
+        self.client.get(reverse('manager'))
+        product = self.products[0]
+        product.product = 'Переименованный'
+        product.save()
+        response = self.client.get(reverse('manager'))
+        self.assertContains(response, 'Переименованный')
+        Producer.objects.create(name='Новый поставщик')
+        self.assertContains(self.client.get(reverse('manager')), 'Новый поставщик')
+        Product.objects.filter(id=product.id).update(product='Через update')
+        self.assertContains(self.client.get(reverse('manager')), 'Через update')
+
+    def test_version_bumped_again_after_commit(self):
+        """
+        Версия каталога увеличивается еще раз после фиксации транзакции:
+        список, закэшированный между записью и COMMIT, больше не отдается,
+        а индекс автодополнения остается актуальным без перестроения.
+        """
+        get_product_index()
+        product = self.products[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            product.product = 'До фиксации'
+            product.save()
+            self.client.get(reverse('manager'))
+            before_commit = get_catalog_version()
+        self.assertEqual(get_catalog_version(), before_commit + 1)
+        self.assertEqual(product_index.version, get_catalog_version())
+        misses = listing_cache.stats()['misses']
+        self.client.get(reverse('manager'))
+        self.assertGreater(listing_cache.stats()['misses'], misses)
+
+    def test_eviction_is_bounded(self):
+        """
+        Размер кэша не превышает maxsize, вытесняются давние записи.
+        """
+        lru = VersionedLRUCache(2)
+        for i in range(5):
+            lru.get_or_compute((i,), lambda: i)
+        self.assertEqual(lru.stats(), {'hits': 0, 'misses': 5, 'size': 2, 'maxsize': 2})
+        self.assertEqual(lru.get_or_compute((4,), lambda: None), 4)
+
+
+class ContentAddressedImageTest(TestCase):
+    def setUp(self):
+        """
+        Временный MEDIA_ROOT, чтобы тест не писал в каталог media проекта.
+        """
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=self.media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.products = create_products(2)
+
+    def upload(self, product, content, name='Схема.png'):
+        self.client.post(reverse('upload_product_image', args=[product.id]),
+                         {'image': SimpleUploadedFile(name, content)})
+        product.refresh_from_db()
+        return product.image.name
+
+    def test_identical_uploads_stored_once(self):
+        """
+        Одинаковые файлы сохраняются один раз под именем из хэша, а файл
+        удаляется, когда на него не остается ссылок.
+        """
+        first = self.upload(self.products[0], b'same bytes')
+        second = self.upload(self.products[1], b'same bytes', name='copy.PNG')
+        self.assertEqual(first, second)
+        self.assertEqual(first, f"media/{hashlib.sha256(b'same bytes').hexdigest()[:2]}/"
+                                f"{hashlib.sha256(b'same bytes').hexdigest()}.png")
+        self.assertEqual(ImageBlob.objects.get(name=first).refcount, 2)
+
+        self.upload(self.products[0], b'other bytes')
+        self.assertEqual(ImageBlob.objects.get(name=first).refcount, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[1].delete()
+        self.assertFalse(ImageBlob.objects.filter(name=first).exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media.name, first)))
+
+
+class ThumbnailTest(TestCase):
+    def setUp(self):
+        """
+        Временный MEDIA_ROOT с исходным изображением товара.
+        """
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=self.media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.product = create_products(1)[0]
+        buffer = io.BytesIO()
+        Image.new('RGBA', (800, 1200), (255, 0, 0, 128)).save(buffer, 'PNG')
+        self.product.image = SimpleUploadedFile('photo.png', buffer.getvalue())
+        self.product.save()
+
+    def test_placeholder_until_derivatives_ready(self):
+        """
+        Пока миниатюры не созданы, карточка ссылается на заглушку; после
+        генерации выводится srcset из WebP и JPEG вариантов.
+        """
+        storage = self.product.image.storage
+        name = self.product.image.name
+        self.assertIn('/media/stub.jpg', product_image(self.product))
+
+        render_derivatives(storage.path(name), derivative_targets(name, storage))
+        html = product_image(self.product)
+        self.assertNotIn('stub.jpg', html)
+        self.assertIn('_400.webp 400w', html)
+        with Image.open(storage.path(derivative_name(name, 200, 'jpg'))) as thumb:
+            self.assertEqual(thumb.size, (200, 300))
+
+    def test_finished_generation_changes_etag(self):
+        """
+        Страница, отрисованная с заглушкой, перестает подтверждаться через
+        304, когда генерация миниатюр завершилась.
+        """
+        cache.clear()
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'stub.jpg')
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        with mock.patch('examapp.thumbnails._executor', executor):
+            schedule_derivatives(self.product.image.name, self.product.image.storage)
+            executor.shutdown(wait=True)
+
+        response = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'stub.jpg')
+
+
+class ImportProductsTest(TestCase):
+    def write_csv(self, text):
+        f = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8')
+        f.write(text)
+        f.close()
+        self.addCleanup(os.unlink, f.name)
+        return f.name
+
+    def test_upsert_by_article_with_errors(self):
+        """
+        Импорт создает новые товары и справочники, обновляет существующие
+        по артикулу и сообщает о строках с ошибками, не прерываясь.
+        """
+        existing = create_products(1)[0]
+        path = self.write_csv(
+            'article,product,unit,price,producer,manufacturer,category,discount,amount_on_warehouse\n'
+            f'{existing.article},Обновленный,шт.,"10,5",Поставщик,Производитель,Категория,5,3\n'
+            'N1,Новый,шт.,20,Новый поставщик,Производитель,Категория,0,1\n'
+            'N2,Битый,шт.,abc,Поставщик,Производитель,Категория,0,1\n'
+            'N3,,шт.,1,Поставщик,Производитель,Категория,0,1\n'
+        )
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_products', path, batch_size=2, stdout=out, stderr=err)
+
+        existing.refresh_from_db()
+        self.assertEqual((existing.product, existing.price), ('Обновленный', Decimal('10.5')))
+        self.assertIn('обновленный', existing.search_document)
+        new = Product.objects.get(article='N1')
+        self.assertEqual(new.producer.name, 'Новый поставщик')
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertIn('Строка 4', err.getvalue())
+        self.assertIn('Строка 5', err.getvalue())
+        self.assertIn('создано 1, обновлено 1, ошибок 2', out.getvalue())
+
+    def test_values_checked_against_model_fields(self):
+        """
+        Значения, которые не поместятся в поля модели (слишком длинное
+        название, цена вне max_digits, NaN), отбрасываются как ошибочные
+        строки, а остальная пачка записывается.
+        """
+        path = self.write_csv(
+            'article,product,unit,price,producer,manufacturer,category,discount,amount_on_warehouse\n'
+            f'L1,{"Д" * 256},шт.,1,Поставщик,Производитель,Категория,0,1\n'
+            'L2,Дорогой,шт.,1e20,Поставщик,Производитель,Категория,0,1\n'
+            'L3,Не число,шт.,NaN,Поставщик,Производитель,Категория,0,1\n'
+            f'L4,Товар,шт.,1,{"П" * 256},Производитель,Категория,0,1\n'
+            'L5,Товар,шт.,"10,5",Поставщик,Производитель,Категория,0,1\n'
+        )
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_products', path, stdout=out, stderr=err)
+
+        self.assertEqual(list(Product.objects.values_list('article', flat=True)), ['L5'])
+        for line in range(2, 6):
+            self.assertIn(f'Строка {line}:', err.getvalue())
+        self.assertIn('создано 1, обновлено 0, ошибок 4', out.getvalue())
+
+
+class ExportProductsTest(CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Подготовка менеджера и каталога для выгрузки.
+        """
+        self.login_user()
+        self.products = create_products(3)
+        Product.objects.filter(id=self.products[1].id).update(discount=10)
+
+    def test_csv_export_applies_filters(self):
+        """
+        CSV отдается потоком, учитывает фильтры и сортировку списка и
+        содержит итоговую цену со скидкой.
+        """
+        response = self.client.get(reverse('export_products'), {'search': 'товар', 'sort': 'amount_desc'})
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()))
+        self.assertEqual(rows[0][8], 'Цена со скидкой')
+        self.assertEqual([r[0] for r in rows[1:]], ['A00002', 'A00001', 'A00000'])
+        self.assertEqual(rows[2][8], '90.00')
+
+    def test_json_export(self):
+        """
+        JSON-выгрузка - корректный массив объектов.
+        """
+        response = self.client.get(reverse('export_products'), {'format': 'json', 'search': 'A00001'})
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['Артикул'], 'A00001')
+
+
+class RoleCacheTest(CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Пользователь с ролью клиента и пустой кэш групп.
+        """
+        self.login_user('Авторизованный клиент', login=False)
+        self.client_group = Group.objects.get(name='Авторизованный клиент')
+
+    def test_login_routes_by_role(self):
+        """
+        Вход перенаправляет на страницу роли с наивысшим приоритетом.
+        """
+        response = self.client.post(reverse('login'), {'username': 'test', 'password': 'Test1234'})
+        self.assertRedirects(response, reverse('client'), fetch_redirect_response=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(Group.objects.create(name='Администратор'))
+        response = self.client.post(reverse('login'), {'username': 'test', 'password': 'Test1234'})
+        self.assertRedirects(response, reverse('admin'), fetch_redirect_response=False)
+
+    def test_group_names_cached_and_invalidated(self):
+        """
+        Повторная проверка доступа не обращается к БД, а изменение состава
+        групп сбрасывает кэш.
+        """
+        self.assertEqual(get_user_role(User.objects.get(pk=self.user.pk)), 'client')
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_role(user), 'client')
+            self.assertFalse(check_group_access(user, 'Менеджер'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.remove(self.client_group)
+        self.assertIsNone(get_user_role(User.objects.get(pk=self.user.pk)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_group.user_set.add(self.user)
+        self.assertEqual(get_user_role(User.objects.get(pk=self.user.pk)), 'client')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_group.user_set.clear()
+        self.assertIsNone(get_user_role(User.objects.get(pk=self.user.pk)))
+
+    def test_revoked_role_not_cached_again_before_commit(self):
+        """
+        Кэш групп сбрасывается после фиксации: запрос, прочитавший старый
+        состав групп до COMMIT, не оставляет его в кэше.
+        """
+        admin_group = Group.objects.create(name='Администратор')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(admin_group)
+        self.assertEqual(get_user_role(User.objects.get(pk=self.user.pk)), 'admin')
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user.groups.clear()
+            # Параллельный запрос успевает до COMMIT и видит прежние группы
+            cache.set(user_groups_cache_key(self.user.pk), frozenset({'Администратор'}))
+        self.assertTrue(callbacks)
+        self.assertIsNone(get_user_role(User.objects.get(pk=self.user.pk)))
+
+
+class ProductCardCacheTest(TestCase):
+    def setUp(self):
+        """
+        Каталог из нескольких товаров и пустой кэш карточек.
+        """
+        cache.clear()
+        self.products = create_products(3)
+
+    def test_cards_rendered_once_and_refreshed_on_change(self):
+        """
+        Карточки отрисовываются один раз, а изменение товара или
+        названия категории дает новую карточку.
+        """
+        products = list(Product.objects.select_related('producer', 'manufacturer', 'category'))
+        first = dict(cached_product_cards(products))
+        self.assertEqual(len(cache.get_many([card_cache_key(p) for p in products])), 3)
+        with mock.patch('examapp.templatetags.product_cards.get_template') as get_template:
+            self.assertEqual(dict(cached_product_cards(products)), first)
+            get_template.return_value.render.assert_not_called()
+
+        self.products[0].discount = 20
+        self.products[0].save()
+        self.products[1].category.name = 'Новая категория'
+        self.products[1].category.save()
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '<s style="color: red">100.00 Р</s> | 80.00 Р', html=False)
+        self.assertContains(response, 'Новая категория')
+
+    def test_save_with_update_fields_refreshes_card(self):
+        """
+        save(update_fields=...) тоже обновляет updated_at, и карточка с
+        прежней ценой больше не отдается из кэша.
+        """
+        self.client.get(reverse('home'))
+        product = self.products[0]
+        product.price = 250
+        product.save(update_fields=['price'])
+        self.assertContains(self.client.get(reverse('home')), '250.00 Р')
+
+
+class FinalPriceTest(CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Менеджер и каталог с разными ценами и скидками.
+        """
+        self.login_user()
+        self.products = create_products(4)
+        for product, (price, discount) in zip(self.products, ((100, 0), (200, 50), (300, 10), (50, 0))):
+            product.price, product.discount = price, discount
+            product.save()
+
+    def test_final_price_kept_in_sync(self):
+        """
+        Цена со скидкой пересчитывается при save() и при update(),
+        в том числе с выражениями F().
+        """
+        self.assertEqual([p.final_price for p in Product.objects.order_by('id')],
+                         [Decimal('100'), Decimal('100'), Decimal('270'), Decimal('50')])
+        Product.objects.filter(id=self.products[0].id).update(discount=25)
+        Product.objects.filter(id=self.products[2].id).update(price=F('price') * 2)
+        self.assertEqual(Product.objects.get(id=self.products[0].id).final_price, Decimal('75'))
+        self.assertEqual(Product.objects.get(id=self.products[2].id).final_price, Decimal('540'))
+
+    def test_price_sort_and_filters(self):
+        """
+        Сортировка и фильтры по цене используют цену со скидкой.
+        """
+        def ids(params):
+            response = self.client.get(reverse('manager'), params)
+            return [p.id for p in response.context['products']]
+
+        p = self.products
+        self.assertEqual(ids({'sort': 'price_desc'}), [p[2].id, p[1].id, p[0].id, p[3].id])
+        self.assertEqual(ids({'sort': 'price_asc', 'min_price': '60', 'max_price': '100'}), [p[0].id, p[1].id])
+        self.assertEqual(ids({'discount': '1'}), [p[1].id, p[2].id])
+        self.assertEqual(len(ids({'min_price': 'abc'})), 4)
+
+
+class BenchmarkCommandsTest(TestCase):
+    def test_seed_and_benchmark(self):
+        """
+        Генератор данных создает связанный каталог и заказы, а прогон
+        бенчмарка выдает метрики по каждому сценарию в JSON.
+        """
+        call_command('seed_catalog', products=30, orders=20, clients=3, pvz=2, batch_size=7, stdout=io.StringIO())
+        self.assertEqual(Product.objects.count(), 30)
+        self.assertEqual(Order.objects.count(), 20)
+        self.assertEqual(get_user_role(User.objects.get(username='bench_manager')), 'manager')
+
+        out = io.StringIO()
+        call_command('benchmark_views', iterations=2, warmup=0, only=['home', 'manager', 'search', 'metrics'],
+                     stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual({r['name'] for r in report['results']}, {'home', 'manager', 'search', 'metrics'})
+        for result in report['results']:
+            self.assertEqual(result['status'], 200)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['peak_memory_kb'], 0)
+
+
+class PerformanceMetricsTest(CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Менеджер, небольшой каталог и пустой реестр метрик.
+        """
+        registry.clear()
+        self.login_user()
+        create_products(3)
+
+    def test_metrics_endpoint_exposes_histograms(self):
+        """
+        Время запроса, SQL и шаблонов собирается по имени URL и
+        отдается в текстовом формате Prometheus.
+        """
+        self.client.get(reverse('manager'))
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('exam_request_duration_seconds_count{view="manager"} 1', body)
+        self.assertIn('exam_request_queries_bucket{view="manager",le="+Inf"} 1', body)
+        self.assertIn('exam_request_template_seconds_sum{view="manager"}', body)
+        self.assertIn('exam_listing_cache_misses_total', body)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_require_staff_or_token(self):
+        """
+        Метрики доступны персоналу и по токену из настроек; запрос с
+        локального адреса (например, через прокси) без токена отклоняется.
+        """
+        self.client.logout()
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_request_logged_with_queries(self):
+        """
+        Запрос дольше порога пишется в лог вместе с самыми медленными SQL.
+        """
+        with self.assertLogs('examapp.middleware', 'WARNING') as logs:
+            self.client.get(reverse('manager'))
+        self.assertIn('(manager)', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+class OrderSummaryTest(CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Два статуса, два пункта выдачи и клиент для заказов.
+        """
+        self.login_user(login=False)
+        self.new, self.done = (StatusOrder.objects.create(name=name) for name in ('Новый', 'Выдан'))
+        self.pvz = [Pvz.objects.create(index=1, city='Москва', street='Ленина', number=i) for i in (1, 2)]
+
+    def create_order(self, pvz, day=1):
+        return Order.objects.create(number_order=1, arcticle='A1', amount_product=1, date_order=date(2024, 1, 1),
+                                    date_delivery=date(2024, 1, day), pvz=pvz, client=self.user, code=100,
+                                    status=self.new)
+
+    def summaries(self):
+        return (dict(OrderStatusSummary.objects.filter(orders__gt=0).values_list('status__name', 'orders')),
+                dict(OrderPvzSummary.objects.filter(orders__gt=0).values_list('pvz_id', 'orders')),
+                dict(OrderDeliverySummary.objects.filter(orders__gt=0).values_list('date_delivery', 'orders')))
+
+    def test_summaries_follow_order_changes(self):
+        """
+        Создание, смена статуса и удаление заказа сдвигают счетчики
+        в сводных таблицах без пересчета.
+        """
+        first = self.create_order(self.pvz[0])
+        self.create_order(self.pvz[1], day=2)
+        first = Order.objects.get(pk=first.pk)
+        first.status = self.done
+        first.save()
+        self.assertEqual(self.summaries(), (
+            {'Новый': 1, 'Выдан': 1},
+            {self.pvz[0].id: 1, self.pvz[1].id: 1},
+            {date(2024, 1, 1): 1, date(2024, 1, 2): 1},
+        ))
+
+        first.delete()
+        self.assertEqual(self.summaries()[0], {'Новый': 1})
+        self.assertEqual(self.summaries()[2], {date(2024, 1, 2): 1})
+
+    def test_rebuild_matches_incremental(self):
+        """
+        Команда rebuild_order_stats дает те же сводки, что и сигналы,
+        в том числе после bulk_create, который сигналы не вызывает.
+        """
+        for i in range(5):
+            self.create_order(self.pvz[i % 2], day=i % 3 + 1)
+        incremental = self.summaries()
+        Order.objects.bulk_create([Order(number_order=2, arcticle='A2', amount_product=1,
+                                         date_order=date(2024, 1, 1), date_delivery=date(2024, 1, 9),
+                                         pvz=self.pvz[0], client=self.user, code=100, status=self.done)])
+
+        call_command('rebuild_order_stats', batch_size=2, stdout=io.StringIO())
+        status, pvz, delivery = self.summaries()
+        self.assertEqual(status, {'Новый': 5, 'Выдан': 1})
+        self.assertEqual(pvz[self.pvz[0].id], incremental[1][self.pvz[0].id] + 1)
+        self.assertEqual(delivery, {**incremental[2], date(2024, 1, 9): 1})
+
+    def test_dashboard_reads_summaries(self):
+        """
+        Панель доступна менеджеру и строится по сводкам, а клиенту
+        доступ закрыт.
+        """
+        self.create_order(self.pvz[0])
+        self.client.login(username='test', password='Test1234')
+        self.assertEqual(self.client.get(reverse('orders_dashboard')).status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(Group.objects.create(name='Менеджер'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('orders_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Новый')
+        self.assertContains(response, '01.01.2024')
+        self.assertFalse(any('"examapp_order"' in q['sql'] for q in queries.captured_queries))
+
+
+class QueryPlanAuditTest(TestCase):
+    def test_indexes_cover_view_queries(self):
+        """
+        Для запросов представлений нет ни полных просмотров, ни
+        сортировок вне индекса.
+        """
+        create_products(5)
+        out = io.StringIO()
+        call_command('audit_query_plans', fail_on_warning=True, stdout=out)
+        self.assertIn('orders by client: OK', out.getvalue())
+
+    def test_postgresql_plan_warnings(self):
+        """
+        В плане PostgreSQL отмечаются Seq Scan и Sort, но не Incremental Sort.
+        """
+        from .management.commands.audit_query_plans import plan_warnings
+
+        plan = ('Limit  (cost=0.00..1.00 rows=51 width=8)\n'
+                '  ->  Sort  (cost=10.00..11.00 rows=100 width=8)\n'
+                '        ->  Seq Scan on examapp_product  (cost=0.00..5.00 rows=100 width=8)')
+        self.assertEqual(plan_warnings(plan, 'postgresql'),
+                         ['последовательное чтение examapp_product', 'сортировка без индекса'])
+        self.assertEqual(plan_warnings('Incremental Sort  (cost=1.00..2.00 rows=1 width=8)', 'postgresql'), [])
+
+
+# Данные создаются только в основной базе, реплика здесь не участвует
+@override_settings(PRODUCTS_PAGE_SIZE=5, REPLICA_READS=False)
+class AsyncViewsTest(CatalogUserMixin, TransactionTestCase):
+    # Запросы асинхронных представлений идут из других потоков со своими
+    # соединениями, поэтому данные должны быть зафиксированы
+    def setUp(self):
+        """
+        Менеджер и каталог из 8 товаров.
+        """
+        self.login_user()
+        create_products(8)
+
+    def make_request(self, path, data=None):
+        request = AsyncRequestFactory().get(path, data)
+        SessionMiddleware(lambda r: None).process_request(request)
+        request.session = self.client.session
+        MessageMiddleware(lambda r: None).process_request(request)
+        return request
+
+    def test_manager_matches_sync_view(self):
+        """
+        Асинхронный список дает ту же страницу, что и синхронный, а
+        запросы из параллельных потоков учитываются в бюджете.
+        """
+        data = {'sort': 'amount_desc'}
+        with track_queries(QueryCounter()) as queries:
+            response = async_to_sync(async_views.manager)(self.make_request('/manager/', data))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(queries.count, 3)
+
+        listing_cache.clear()
+        expected = self.client.get(reverse('manager'), data).context['products']
+        for product in expected:
+            self.assertContains(response, f'{product.product}</strong>')
+        self.assertNotContains(response, 'Товар 1</strong>')
+
+    def test_login_required(self):
+        """
+        Гость перенаправляется на страницу входа.
+        """
+        request = AsyncRequestFactory().get('/admin-panel/')
+        SessionMiddleware(lambda r: None).process_request(request)
+        response = async_to_sync(async_views.admin)(request)
+        self.assertEqual(response.status_code, 302)
+
+    def test_search_from_index(self):
+        """
+        Автодополнение в асинхронном варианте отвечает из индекса.
+        """
+        product_index.built = False
+        response = async_to_sync(async_views.search_view)(self.make_request('/search/', {'q': 'товар 7'}))
+        self.assertEqual([item['article'] for item in json.loads(response.content)], ['A00007'])
+
+    def test_concurrency_benchmark(self):
+        """
+        Нагрузочный прогон из нескольких потоков и через ASGI-обработчик
+        проходит без ошибок и считает пропускную способность.
+        """
+        call_command('seed_catalog', products=20, orders=5, clients=2, pvz=2, stdout=io.StringIO())
+        for server in ('wsgi', 'asgi'):
+            out = io.StringIO()
+            call_command('benchmark_concurrency', server=server, concurrency=3, requests=6,
+                         only=['manager', 'search'], stdout=out)
+            report = json.loads(out.getvalue())
+            self.assertEqual(report['server'], server)
+            for result in report['results']:
+                self.assertEqual((result['requests'], result['errors']), (6, 0))
+                self.assertGreater(result['rps'], 0)
+
+
+@skipUnless(REPLICA_ALIAS in settings.DATABASES, 'Реплика не настроена (DB_REPLICA_NAME)')
+class ReplicaRoutingTest(CatalogUserMixin, TransactionTestCase):
+    # Основная база и реплика - две отдельные тестовые базы, поэтому по
+    # содержимому ответа видно, откуда читались данные
+    databases = '__all__'
+
+    def setUp(self):
+        """
+        Менеджер в основной базе и разные товары в основной базе и на реплике.
+        """
+        self.login_user()
+        create_products(1)
+        Product.objects.filter(pk__isnull=False).update(product='Товар основной базы')
+        # Справочники на реплике те же, что в основной базе, плюс поставщик,
+        # запись которого до основной базы еще не дошла
+        for model in (Producer, Manufacturer, CategoryProduct):
+            model.objects.using(REPLICA_ALIAS).bulk_create(model.objects.all())
+        Producer.objects.using(REPLICA_ALIAS).create(name='Поставщик реплики')
+        Product.objects.using(REPLICA_ALIAS).create(
+            article='R1', product='Товар реплики', unit='шт.', price=100, producer=Producer.objects.first(),
+            manufacturer=Manufacturer.objects.first(), category=CategoryProduct.objects.first(),
+            discount=0, amount_on_warehouse=1, description='Описание', image='stub.jpg',
+        )
+
+    def test_catalog_reads_from_replica(self):
+        """
+        Каталог читается с реплики, а пользователь и сессия - с основной базы.
+        Ответ с данными реплики отдается без ETag: реплика может отставать
+        от версии каталога основной базы.
+        """
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Товар реплики')
+        self.assertNotContains(response, 'Товар основной базы')
+        self.assertNotIn('ETag', response.headers)
+
+    def test_versioned_caches_filled_from_primary(self):
+        """
+        Кэши под версией каталога (список товаров, справочники, индекс
+        автодополнения) заполняются только чтением с основной базы.
+        """
+        response = self.client.get(reverse('manager'))
+        self.assertContains(response, 'Товар основной базы')
+        self.assertNotContains(response, 'Товар реплики')
+        self.assertIn('ETag', response.headers)
+        self.assertNotIn('Поставщик реплики', [p.name for p in dimension_list(Producer)])
+
+        response = self.client.get(reverse('search'), {'q': 'товар'})
+        self.assertEqual([p['product'] for p in response.json()], ['Товар основной базы'])
+
+    def test_write_pins_client_to_primary(self):
+        """
+        После записи в каталог клиент получает cookie и дальше читает
+        с основной базы.
+        """
+        def write_view(request):
+            Producer.objects.create(name='Новый поставщик')
+            return HttpResponse()
+
+        response = PrimaryPinMiddleware(write_view)(RequestFactory().get('/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        self.client.cookies[PIN_COOKIE] = '1'
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Товар основной базы')
+        self.assertNotContains(response, 'Товар реплики')
+        self.assertIn('ETag', response.headers)
+
+
+class SessionWritesTest(CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Менеджер и небольшой каталог.
+        """
+        self.login_user('Менеджер', login=False)
+        create_products(3)
+
+    def run_flow(self, page_views=5):
+        """
+        Вход, несколько просмотров каталога и выход; число пишущих
+        запросов к БД по шагам.
+        """
+        writes = {}
+
+        def step(name, method, url, data=None):
+            with track_queries(QueryCounter()) as queries:
+                response = getattr(self.client, method)(url, data)
+            writes[name] = writes.get(name, 0) + queries.writes
+            return response
+
+        step('login', 'post', reverse('login'), {'username': 'test', 'password': 'Test1234'})
+        first_page = step('pages', 'get', reverse('manager'))
+        for _ in range(page_views - 1):
+            step('pages', 'get', reverse('manager'))
+        step('logout', 'get', reverse('logout'))
+        last_page = step('pages', 'get', reverse('login'))
+        return writes, first_page, last_page
+
+    def test_page_views_do_not_write(self):
+        """
+        Приветствие и прощание приходят через cookie сообщений, поэтому
+        просмотры страниц не пишут в БД, а сообщения по-прежнему видны.
+        """
+        writes, first_page, last_page = self.run_flow()
+        self.assertEqual(writes['pages'], 0)
+        self.assertContains(first_page, 'Добро пожаловать, test!')
+        self.assertContains(last_page, 'До свидания, test!')
+        self.assertNotContains(self.client.get(reverse('login')), 'До свидания')
+
+    def test_fewer_writes_than_session_storage(self):
+        """
+        Нагрузочный сценарий: с сообщениями в сессии каждый показ
+        сообщения - это запись в таблицу сессий.
+        """
+        cookie_writes = sum(self.run_flow(page_views=20)[0].values())
+        with self.settings(MESSAGE_STORAGE='django.contrib.messages.storage.session.SessionStorage'):
+            session_writes = sum(self.run_flow(page_views=20)[0].values())
+        self.assertLess(cookie_writes, session_writes)
+
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        """
+        Три товара с остатками 10, 11 и 12 ед.
+        """
+        self.products = create_products(3)
+        Product.objects.update(amount_on_warehouse=F('amount_on_warehouse') + 10)
+
+    def stock(self):
+        return dict(Product.objects.values_list('article', 'amount_on_warehouse'))
+
+    def test_batch_reservation_is_one_update(self):
+        """
+        Все строки заказа списываются одним UPDATE, а повтор с тем же
+        ключом ничего не меняет.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(reserve_stock('order:1', {'A00000': 3, 'A00001': 11, 'A00002': 1}))
+        self.assertEqual(sum(q['sql'].startswith('UPDATE "examapp_product"') for q in queries.captured_queries), 1)
+        self.assertEqual(self.stock(), {'A00000': 7, 'A00001': 0, 'A00002': 11})
+
+        self.assertFalse(reserve_stock('order:1', {'A00000': 3}))
+        self.assertEqual(self.stock()['A00000'], 7)
+
+    def test_insufficient_stock_changes_nothing(self):
+        """
+        Если не хватает хотя бы одной позиции, заказ не списывается целиком
+        и ключ остается свободным.
+        """
+        with self.assertRaises(InsufficientStock) as error:
+            reserve_stock('order:2', {'A00000': 1, 'A00001': 12})
+        self.assertEqual(error.exception.articles, ['A00001'])
+        self.assertEqual(self.stock(), {'A00000': 10, 'A00001': 11, 'A00002': 12})
+        self.assertTrue(reserve_stock('order:2', {'A00000': 1}))
+
+    def test_release_returns_stock_once(self):
+        """
+        Отмена возвращает остатки, повторная отмена ничего не делает.
+        """
+        reserve_stock('order:3', {'A00002': 5})
+        self.assertTrue(release_stock('order:3'))
+        self.assertFalse(release_stock('order:3'))
+        self.assertEqual(self.stock()['A00002'], 12)
+
+    def test_duplicate_article_reported(self):
+        """
+        Артикул, которому соответствует несколько товаров, не списывается
+        ни с одного из них и называется в ошибке; отсутствующий артикул
+        считается нехваткой остатков.
+        """
+        duplicate = create_products(1)[0]
+        Product.objects.filter(id=duplicate.id).update(amount_on_warehouse=50)
+        with self.assertRaises(AmbiguousArticle) as error:
+            reserve_stock('order:4', {'A00000': 1, 'A00001': 1})
+        self.assertEqual(error.exception.articles, ['A00000'])
+        stock = Product.objects.filter(article='A00000').values_list('amount_on_warehouse', flat=True)
+        self.assertEqual(sorted(stock), [10, 50])
+        self.assertEqual(self.stock()['A00001'], 11)
+
+        with self.assertRaises(InsufficientStock) as error:
+            reserve_stock('order:4', {'A00001': 1, 'NONE': 1})
+        self.assertEqual(error.exception.articles, ['NONE'])
+        self.assertTrue(reserve_stock('order:4', {'A00001': 1}))
+
+
+@skipIf(connection.vendor == 'sqlite', 'SQLite в памяти не допускает параллельной записи из потоков')
+class StockReservationStressTest(TransactionTestCase):
+    def test_no_oversell_under_concurrency(self):
+        """
+        Параллельные списания из нескольких потоков не уводят остатки в
+        минус, сходятся со списаниями и не списывают повторно.
+        """
+        out = io.StringIO()
+        call_command('benchmark_stock', threads=8, orders=800, products=5, stock=100, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['oversold'], [])
+        self.assertEqual(report['mismatched'], [])
+        self.assertEqual(report['duplicates_applied'], 0)
+        self.assertGreater(report['rejected'], 0)
+        self.assertGreater(report['reservations_per_second'], 0)
+
+
+class ConditionalGetTest(CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Менеджер, администратор и каталог из трех товаров.
+        """
+        self.login_user('Менеджер')
+        admin = User.objects.create_user(username='boss', password='Test1234')
+        admin.groups.add(Group.objects.create(name='Администратор'))
+        self.products = create_products(3)
+
+    def test_unchanged_listing_is_304_without_product_queries(self):
+        """
+        Повторный запрос с If-None-Match получает 304 без запросов к товарам
+        и без отрисовки шаблона.
+        """
+        url = reverse('manager')
+        response = self.client.get(url, {'sort': 'price_asc'})
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'sort': 'price_asc'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.templates, [])
+        self.assertFalse(any('examapp_product' in q['sql'] for q in queries.captured_queries))
+
+        self.assertEqual(self.client.get(url, {'sort': 'price_desc'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        Product.objects.filter(pk=self.products[0].pk).update(discount=10)
+        self.assertEqual(self.client.get(url, {'sort': 'price_asc'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_role(self):
+        """
+        Одна и та же страница для разных ролей имеет разные ETag. При входе
+        меняется секрет CSRF, поэтому у обоих запросов он одинаковый.
+        """
+        manager_etag = self.client.get(reverse('home'))['ETag']
+        csrf_cookie = self.client.cookies[settings.CSRF_COOKIE_NAME].value
+        self.client.login(username='boss', password='Test1234')
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = csrf_cookie
+        self.assertNotEqual(self.client.get(reverse('home'))['ETag'], manager_etag)
+
+    def test_search_etag_follows_index(self):
+        """
+        Пока индекс автодополнения отстает от версии каталога, его ответ не
+        получает ETag новой версии и после перестроения индекса отдается
+        заново, а не 304.
+        """
+        get_product_index()
+        bump_catalog_version()
+        response = self.client.get(reverse('search'), {'q': 'товар'})
+        self.assertNotIn('Last-Modified', response)
+
+        load_product_index()
+        response = self.client.get(reverse('search'), {'q': 'товар'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_json_and_messages(self):
+        """
+        JSON автодополнения отдает 304, а страница с ожидающим сообщением
+        всегда отдается целиком.
+        """
+        response = self.client.get(reverse('search'), {'q': 'товар'})
+        response = self.client.get(reverse('search'), {'q': 'товар'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        etag = self.client.get(reverse('manager'))['ETag']
+        self.client.cookies['messages'] = 'pending'
+        response = self.client.get(reverse('manager'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+
+class DimensionCacheTest(CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Менеджер, каталог и пустые кэши.
+        """
+        self.login_user('Менеджер')
+        self.products = create_products(3)
+
+    def test_listing_resolves_names_without_joins(self):
+        """
+        Страница каталога читает товары без JOIN, а справочники загружаются
+        одним запросом и при повторном обращении берутся из памяти.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('manager'))
+        self.assertContains(response, 'Поставщик')
+        self.assertContains(response, 'Производитель')
+        product_queries = [q['sql'] for q in queries if 'FROM "examapp_product"' in q['sql']]
+        self.assertTrue(product_queries)
+        self.assertFalse([sql for sql in product_queries if 'JOIN' in sql])
+        self.assertEqual(len([q for q in queries if 'examapp_producer' in q['sql']]), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            products = attach_dimensions(Product.objects.all())
+            names = {(p.producer.name, p.manufacturer.name, p.category.name) for p in products}
+        self.assertEqual(names, {('Поставщик', 'Производитель', 'Категория')})
+        self.assertEqual(len(queries), 1)
+
+    def test_change_reloads_tables(self):
+        """
+        Изменение или удаление записи справочника меняет общую версию, и
+        процесс перечитывает таблицы.
+        """
+        self.client.get(reverse('manager'))
+        producer = self.products[0].producer
+        producer.name = 'Переименованный поставщик'
+        producer.save()
+        self.assertContains(self.client.get(reverse('manager')), 'Переименованный поставщик')
+
+        pvz = Pvz.objects.create(index=1, city='Город', street='Улица', number=1)
+        self.assertEqual(dimension_cache.table(Pvz), {pvz.id: pvz})
+        pvz.delete()
+        self.assertEqual(dimension_cache.table(Pvz), {})
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_bulk_import_refreshes_tables(self):
+        """
+        Импорт создает справочники через bulk_create, без сигналов; версия
+        кэша все равно меняется, поэтому новый поставщик есть в списке, а
+        страница не загружает справочники по запросу на товар.
+        """
+        self.client.get(reverse('manager'))
+        f = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8')
+        f.write('article,product,unit,price,producer,manufacturer,category\n')
+        for i in range(20):
+            f.write(f'B{i},Импорт {i},шт.,10,Импортный поставщик,Импортный производитель,Импортная категория\n')
+        f.close()
+        self.addCleanup(os.unlink, f.name)
+        call_command('import_products', f.name, stdout=io.StringIO())
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('manager'), {'search': 'импорт'})
+        self.assertContains(response, 'Импортный поставщик (20)')
+        self.assertContains(response, 'Импортная категория')
+        self.assertLessEqual(len(queries), 6)
+
+
+class FacetCountsTest(CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Два поставщика: у первого три товара, у второго - два товара
+        другого производителя с другим названием.
+        """
+        self.login_user('Менеджер')
+        self.first = create_products(3)[0]
+        second = create_products(2, producer_name='Второй поставщик')
+        for product in second:
+            product.product = 'Лампа'
+        Product.objects.bulk_update(second, ['product'])
+        self.second = second[0]
+        Producer.objects.create(name='Пустой поставщик')
+
+    def test_facets_in_single_aggregate(self):
+        """
+        Числа по поставщикам, производителям и категориям считаются одним
+        запросом с GROUP BY, из них же берется общее число товаров.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('manager'))
+        facets = response.context['facets']
+        self.assertEqual(dict(facets['producer']), {self.first.producer_id: 3, self.second.producer_id: 2})
+        self.assertEqual(dict(facets['manufacturer']), {self.first.manufacturer_id: 3,
+                                                        self.second.manufacturer_id: 2})
+        self.assertEqual(response.context['total_products'], 5)
+        self.assertEqual(len([q for q in queries if 'GROUP BY' in q['sql']]), 1)
+        self.assertContains(response, 'Второй поставщик (2)')
+        self.assertContains(response, 'disabled>\n                            Пустой поставщик (0)')
+
+    def test_facets_follow_search_and_producer(self):
+        """
+        Поиск сужает все фасеты; выбранный поставщик сужает производителей
+        и категории, но не список поставщиков.
+        """
+        response = self.client.get(reverse('manager'), {'search': 'лампа'})
+        self.assertEqual(dict(response.context['facets']['producer']), {self.second.producer_id: 2})
+
+        response = self.client.get(reverse('manager'), {'producer': self.first.producer_id})
+        facets = response.context['facets']
+        self.assertEqual(dict(facets['producer']), {self.first.producer_id: 3, self.second.producer_id: 2})
+        self.assertEqual(dict(facets['manufacturer']), {self.first.manufacturer_id: 3})
+        self.assertEqual(response.context['total_products'], 3)
+
+
+class PickupTest(CatalogUserMixin, TestCase):
+    def setUp(self):
+        """
+        Два пункта выдачи, сотрудник-менеджер, клиент и заказы со статусом
+        "Готов к выдаче" с кодами 100, 101, ... в первом пункте.
+        """
+        self.login_user('Менеджер')
+        self.ready, self.issued = (StatusOrder.objects.create(name=name) for name in ('Готов к выдаче', 'Выдан'))
+        self.pvz, self.other_pvz = (Pvz.objects.create(index=1, city='Москва', street='Ленина', number=i)
+                                    for i in (1, 2))
+        self.customer = User.objects.create_user(username='client', password='Test1234', first_name='Иван')
+
+    def create_orders(self, count, pvz=None, start=100):
+        return [Order.objects.create(number_order=i, arcticle='A1', amount_product=1, date_order=date(2024, 1, 1),
+                                     date_delivery=date(2024, 1, 2), pvz=pvz or self.pvz, client=self.customer,
+                                     code=start + i, status=self.ready)
+                for i in range(count)]
+
+    def issue(self, codes, pvz=None):
+        return self.client.post(reverse('pvz_issue_orders', args=[(pvz or self.pvz).id]),
+                                json.dumps({'codes': codes}), content_type='application/json')
+
+    def test_lookup_by_code(self):
+        """
+        Поиск по коду возвращает только заказы своего пункта выдачи.
+        """
+        self.create_orders(2)
+        self.create_orders(1, pvz=self.other_pvz)
+        response = self.client.get(reverse('pvz_order_lookup', args=[self.pvz.id]), {'code': ['100', 'abc']})
+        data = response.json()
+        self.assertEqual(len(data), 1)
+        self.assertEqual((data[0]['code'], data[0]['client'], data[0]['status']), ('100.00', 'Иван', 'Готов к выдаче'))
+        self.assertEqual(self.client.get(reverse('pvz_order_lookup', args=[999])).status_code, 404)
+
+    def test_batch_issue_is_bulk(self):
+        """
+        Пачка кодов выдается за число запросов, не зависящее от размера
+        пачки; сводная таблица статусов остается согласованной.
+        """
+        self.create_orders(3)
+        self.issue(['100'])
+        with CaptureQueriesContext(connection) as few:
+            self.issue(['101'])
+        self.create_orders(40, start=200)
+        with CaptureQueriesContext(connection) as many:
+            response = self.issue([str(200 + i) for i in range(40)])
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(len(response.json()['issued']), 40)
+        self.assertEqual(len([q for q in many if q['sql'].startswith('UPDATE "examapp_order"')]), 1)
+
+        summary = dict(OrderStatusSummary.objects.values_list('status__name', 'orders'))
+        self.assertEqual(summary, {'Готов к выдаче': 1, 'Выдан': 42})
+        self.assertEqual(Order.objects.filter(status=self.issued).count(), 42)
+
+    def test_repeat_and_unknown_codes(self):
+        """
+        Повторная выдача не меняет заказ, а коды чужого пункта и
+        нераспознанные коды попадают в not_found.
+        """
+        self.create_orders(1)
+        self.create_orders(1, pvz=self.other_pvz, start=300)
+        self.issue(['100'])
+        data = self.issue(['100', '300', 'x']).json()
+        self.assertEqual(data['issued'], [])
+        self.assertEqual([order['code'] for order in data['already_issued']], ['100.00'])
+        self.assertEqual(sorted(data['not_found']), ['300', 'x'])
+        self.assertEqual(self.issue('100').status_code, 400)
+        self.assertEqual(self.client.get(reverse('pvz_issue_orders', args=[self.pvz.id])).status_code, 405)
+
+class StaticAssetsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Сборка статики (collectstatic) один раз во временный STATIC_ROOT.
+        """
+        super().setUpClass()
+        cls.static_root = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(cls.static_root.cleanup)
+        with override_settings(STATIC_ROOT=cls.static_root.name):
+            call_command('collectstatic', interactive=False, verbosity=0)
+
+    def setUp(self):
+        static_root = override_settings(STATIC_ROOT=self.static_root.name)
+        static_root.enable()
+        self.addCleanup(static_root.disable)
+        self.static_files = StaticFiles()
+
+    def app(self, environ, start_response):
+        start_response('404 Not Found', [])
+        return [b'django']
+
+    def test_build_minifies_hashes_and_compresses(self):
+        """
+        Исходник UIkit заменяется его .min-версией, к имени добавляется хэш,
+        рядом лежит gzip-вариант, а {% static %} ссылается на имя с хэшем.
+        """
+        with open(os.path.join(self.static_root.name, 'staticfiles.json')) as f:
+            hashed = json.load(f)['paths']['uikit/css/uikit.css']
+        self.assertRegex(hashed, r'^uikit/css/uikit\.[0-9a-f]{12}\.css$')
+        path = os.path.join(self.static_root.name, hashed)
+        with open(os.path.join(settings.BASE_DIR, 'examapp/static/uikit/css/uikit.min.css'), 'rb') as f:
+            minified = f.read()
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), minified)
+        with gzip.open(path + '.gz') as f:
+            self.assertEqual(f.read(), minified)
+        self.assertEqual(static('uikit/css/uikit.css'), settings.STATIC_URL + hashed)
+        self.assertEqual(static('images'), settings.STATIC_URL + 'images')
+
+    def test_wsgi_serves_precompressed_file(self):
+        """
+        WSGI-обработчик отдает gzip-вариант с долгим кэшированием через
+        wsgi.file_wrapper и передает остальные запросы приложению.
+        """
+        handler = StaticFilesWSGI(self.app, self.static_files)
+        url = static('uikit/js/uikit.js')
+        started = []
+        file_wrapper = mock.Mock(return_value=['file'])
+        body = handler({'REQUEST_METHOD': 'GET', 'PATH_INFO': url, 'HTTP_ACCEPT_ENCODING': 'gzip, deflate',
+                        'wsgi.file_wrapper': file_wrapper}, lambda status, headers: started.append((status, headers)))
+        self.assertEqual(body, ['file'])
+        status, headers = started[0]
+        headers = dict(headers)
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        sent = file_wrapper.call_args[0][0]
+        sent.close()
+        self.assertTrue(sent.name.endswith('.js.gz'))
+        self.assertEqual(int(headers['Content-Length']), os.path.getsize(sent.name))
+
+        body = handler({'REQUEST_METHOD': 'GET', 'PATH_INFO': url}, lambda status, headers: started.append(headers))
+        self.assertNotIn(('Content-Encoding', 'gzip'), started[-1])
+        self.assertEqual(len(b''.join(body)), int(dict(started[-1])['Content-Length']))
+
+        body = handler({'REQUEST_METHOD': 'GET', 'PATH_INFO': '/static/missing.css'}, lambda *args: None)
+        self.assertEqual(body, [b'django'])
+
+    def test_asgi_uses_pathsend(self):
+        """
+        ASGI-обработчик отдает путь к файлу серверу, если тот поддерживает
+        http.response.pathsend.
+        """
+        handler = StaticFilesASGI(None, self.static_files)
+        messages_sent = []
+
+        async def send(message):
+            messages_sent.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': static('uikit/css/uikit.css'),
+                 'headers': [(b'accept-encoding', b'gzip')], 'extensions': {'http.response.pathsend': {}}}
+        async_to_sync(handler)(scope, None, send)
+        self.assertEqual(messages_sent[0]['status'], 200)
+        self.assertIn((b'content-encoding', b'gzip'), messages_sent[0]['headers'])
+        self.assertEqual(messages_sent[1]['type'], 'http.response.pathsend')
+        self.assertTrue(messages_sent[1]['path'].endswith('.css.gz'))
@@ -0,0 +1,89 @@
+import logging
+import multiprocessing
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from .autocomplete import advance_product_index
+from .caching import bump_catalog_version
+
+logger = logging.getLogger(__name__)
+
+# Форматы производных изображений: WebP для современных браузеров и JPEG
+# как запасной вариант
+FORMATS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+
+_executor = None
+
+
+def derivative_name(name, width, ext):
+    stem = posixpath.splitext(name)[0]
+    return posixpath.join(settings.THUMBNAIL_DIR, f'{stem}_{width}.{ext}')
+
+
+def derivative_targets(name, storage):
+    """
+    Список (путь, ширина, высота, формат) всех производных изображения.
+    Последним идет самый большой WebP: он пишется последним и служит
+    признаком того, что генерация завершена.
+    """
+    targets = []
+    for width, height in settings.THUMBNAIL_SIZES:
+        for ext, image_format in reversed(FORMATS):
+            targets.append((storage.path(derivative_name(name, width, ext)), width, height, image_format))
+    return targets
+
+
+def render_derivatives(source_path, targets):
+    # Выполняется в отдельном процессе, поэтому работает только с путями
+    # и не обращается к Django
+    from PIL import Image
+
+    with Image.open(source_path) as original:
+        original.load()
+        for path, width, height, image_format in targets:
+            image = original.copy()
+            image.thumbnail((width, height))
+            if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.tmp'
+            image.save(tmp_path, image_format, quality=82)
+            os.replace(tmp_path, path)
+    return source_path
+
+
+def derivatives_ready(name, storage):
+    width = settings.THUMBNAIL_SIZES[-1][0]
+    return storage.exists(derivative_name(name, width, FORMATS[0][0]))
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def schedule_derivatives(name, storage):
+    """
+    Постановка генерации производных в пул процессов, вне обработки запроса.
+    """
+    if not name or derivatives_ready(name, storage):
+        return None
+    future = get_executor().submit(render_derivatives, storage.path(name), derivative_targets(name, storage))
+    future.add_done_callback(_derivatives_done)
+    return future
+
+
+def _derivatives_done(future):
+    if future.exception() is not None:
+        logger.error(f"Ошибка генерации миниатюр: {future.exception()}")
+        return
+    # Страницы, отрисованные с заглушкой вместо миниатюр, не должны
+    # подтверждаться через 304 по прежнему ETag. Индекс автодополнения
+    # миниатюры не затрагивают
+    bump_catalog_version(on_commit=advance_product_index)
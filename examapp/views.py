@@ -1,34 +1,60 @@
-from django.db.models import Q
+import csv
+import hmac
+import json
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
-from .models import Product, Producer
+from .models import (CategoryProduct, Manufacturer, OrderDeliverySummary, OrderPvzSummary, OrderStatusSummary,
+                     Product, Producer, Pvz)
+from .dimensions import attach_dimensions, dimension_cache, dimension_list
+from .autocomplete import get_product_index, product_index_version
+from .caching import listing_cache
+from .conditional import conditional_catalog
+from .metrics import registry, render_value
+from .pagination import KeysetPaginator, InvalidCursor
+from .pickup import issue_orders, parse_codes, pvz_orders
+from .querybudget import query_budget
+from .routers import replica_reads
+from .roles import get_user_group_names, get_user_role
+from .search import normalize, search_products
+from .thumbnails import schedule_derivatives
 import logging
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
 logger = logging.getLogger(__name__)
 
 
 def check_group_access(user, group_name):
-    if not user.is_authenticated:
-        return False
-    return user.groups.filter(name=group_name).exists()
+    return group_name in get_user_group_names(user)
 
+# Бюджет на холодных кэшах: сессия, пользователь, его группы (роль для
+# ETag), товары и загрузка справочников
+@query_budget(5)
+@replica_reads
+@conditional_catalog
 def home_view(request):
     try:
-        products = Product.objects.all()
+        products = attach_dimensions(Product.objects.all())
         return render(request, "home.html", {'products': products})
     except Exception as e:
         logger.error(f"Ошибка при загрузке главной страницы: {str(e)}")
         messages.error(request, "Произошла ошибка при загрузке данных. Пожалуйста, попробуйте позже.")
         return render(request, "home.html", {'products': []})
 
+@query_budget(5)
+@replica_reads
 @login_required
 def client(request):
-    if request.session.get('show_welcome_message'):
-        username = request.session.get('username', '')
-        messages.success(request, f"Добро пожаловать, {username}!")
     if not check_group_access(request.user, "Авторизованный клиент"):
         messages.error(request,
                        "У вас нет доступа к этой странице. "
@@ -36,7 +62,7 @@ def client(request):
         raise PermissionDenied("Доступ запрещен")
 
     try:
-        products = Product.objects.all()
+        products = attach_dimensions(Product.objects.all())
         return render(request, "client.html", {'products': products})
     except Exception as e:
         logger.error(f"Ошибка при загрузке страницы клиента: {str(e)}")
@@ -44,89 +70,362 @@ def client(request):
         return render(request, "client.html", {'products': []})
 
 
-def get_filtered_products(request):
-    search_query = request.GET.get('search', '')
-    sort_by = request.GET.get('sort', '')
-    producer_id = request.GET.get('producer', '')
+SORT_ORDERING = {
+    'amount_asc': ('amount_on_warehouse', 'id'),
+    'amount_desc': ('-amount_on_warehouse', '-id'),
+    'price_asc': ('final_price', 'id'),
+    'price_desc': ('-final_price', '-id'),
+}
+DEFAULT_ORDERING = ('id',)
+# Без явной сортировки результаты поиска выводятся по релевантности
+SEARCH_ORDERING = ('-search_rank', 'id')
+
+
+def filter_products(filters):
+    # Поставщик, производитель и категория подставляются из кэша
+    # справочников (attach_dimensions), без JOIN
+    products = Product.objects.all()
+
+    if filters['search']:
+        products = search_products(products, filters['search'])
 
-    products = Product.objects.all().select_related('producer', 'manufacturer', 'category')
+    if filters['producer']:
+        products = products.filter(producer_id=filters['producer'])
 
-    if search_query:
-        products = products.filter(
-            Q(product__icontains=search_query) |
-            Q(article__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(producer__name__icontains=search_query) |
-            Q(manufacturer__name__icontains=search_query)
-        )
+    # Фильтры по цене работают по хранимой цене со скидкой (final_price)
+    if filters['min_price']:
+        products = products.filter(final_price__gte=filters['min_price'])
+    if filters['max_price']:
+        products = products.filter(final_price__lte=filters['max_price'])
+    if filters['discount']:
+        products = products.filter(discount__gt=0)
+    return products
+
+
+def get_ordering(filters):
+    return SORT_ORDERING.get(filters['sort'], SEARCH_ORDERING if filters['search'] else DEFAULT_ORDERING)
+
+
+def load_product_page(filters, cursor):
+    paginator = KeysetPaginator(filter_products(filters), get_ordering(filters), settings.PRODUCTS_PAGE_SIZE)
+    try:
+        page = paginator.page(cursor or None)
+    except InvalidCursor:
+        page = paginator.page()
+    attach_dimensions(page.object_list)
+    return page
 
-    if producer_id:
-        products = products.filter(producer_id=producer_id)
 
-    if sort_by == 'amount_asc':
-        products = products.order_by('amount_on_warehouse')
-    elif sort_by == 'amount_desc':
-        products = products.order_by('-amount_on_warehouse')
+# Наибольшее значение первичного ключа (BigAutoField)
+MAX_ID = 2 ** 63 - 1
+
+
+def parse_price(value):
+    try:
+        price = Decimal(value.replace(',', '.'))
+    except InvalidOperation:
+        return ''
+    return str(price) if price.is_finite() and price >= 0 else ''
+
+
+def parse_id(value):
+    # isdigit() пропускает '²' и числа вне диапазона bigint, на которых
+    # запрос падает с ошибкой
+    if not value.isascii() or not value.isdecimal():
+        return ''
+    pk = int(value)
+    return str(pk) if 0 < pk <= MAX_ID else ''
+
+
+def get_filter_params(request):
+    filters = {
+        'search': request.GET.get('search', ''),
+        'producer': request.GET.get('producer', ''),
+        'min_price': parse_price(request.GET.get('min_price', '')),
+        'max_price': parse_price(request.GET.get('max_price', '')),
+        'discount': '1' if request.GET.get('discount') else '',
+        'sort': request.GET.get('sort', ''),
+    }
+    if filters['sort'] not in SORT_ORDERING:
+        filters['sort'] = ''
+    filters['producer'] = parse_id(filters['producer'])
+    return filters
+
 
-    producers = Producer.objects.all()
+# Поля, по которым считаются фасеты (число товаров по значению фильтра)
+FACET_FIELDS = ('producer_id', 'manufacturer_id', 'category_id')
 
+
+def facet_queryset(filters):
+    # Одна группировка по сочетаниям поставщик/производитель/категория.
+    # Фильтр по поставщику не применяется, чтобы в списке поставщиков были
+    # числа и для остальных; по выбранному поставщику строки отбираются в build_facets
+    return (filter_products({**filters, 'producer': ''})
+            .values_list(*FACET_FIELDS).annotate(count=Count('id')).order_by())
+
+
+def build_facets(rows, producer):
+    facets = {'producer': Counter(), 'manufacturer': Counter(), 'category': Counter()}
+    producer = int(producer) if producer else None
+    for producer_id, manufacturer_id, category_id, count in rows:
+        facets['producer'][producer_id] += count
+        if producer is None or producer_id == producer:
+            facets['manufacturer'][manufacturer_id] += count
+            facets['category'][category_id] += count
+    return facets
+
+
+def listing_loaders(filters, cursor):
+    """
+    Три независимых запроса страницы каталога: сама страница, фасеты (из
+    них же берется общее число товаров) и список поставщиков (из кэша
+    справочников). Синхронное представление выполняет их по очереди,
+    асинхронное - одновременно.
+    """
+    # Результаты кэшируются по нормализованным параметрам фильтра и версии
+    # каталога, которая меняется при любой записи в товары и справочники
+    filter_key = (normalize(filters['search']), filters['producer'], filters['min_price'],
+                  filters['max_price'], filters['discount'])
+    facet_key = filter_key[:1] + filter_key[2:]
+    return (
+        lambda: listing_cache.get_or_compute(
+            ('page', *filter_key, filters['sort'], cursor), lambda: load_product_page(filters, cursor)),
+        lambda: listing_cache.get_or_compute(
+            ('facets', *facet_key), lambda: list(facet_queryset(filters))),
+        lambda: dimension_list(Producer),
+    )
+
+
+def listing_context(filters, page, facet_rows, producers):
+    filter_params = {k: v for k, v in filters.items() if v}
+    facets = build_facets(facet_rows, filters['producer'])
     return {
-        'products': products,
-        'search_query': search_query,
-        'current_sort': sort_by,
-        'current_producer': producer_id,
+        'products': page,
+        'search_query': filters['search'],
+        'current_sort': filters['sort'],
+        'current_producer': filters['producer'],
+        'min_price': filters['min_price'],
+        'max_price': filters['max_price'],
+        'has_discount': filters['discount'],
         'producers': producers,
-        'total_products': products.count()
+        'producer_options': [(producer, facets['producer'][producer.id]) for producer in producers],
+        'facets': facets,
+        'total_products': sum(facets['category'].values()),
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'filter_query': urlencode(filter_params),
+        'base_filter_query': urlencode({k: v for k, v in filter_params.items() if k != 'sort'}),
     }
 
+
+def get_filtered_products(request):
+    filters = get_filter_params(request)
+    loaders = listing_loaders(filters, request.GET.get('cursor', ''))
+    return listing_context(filters, *(load() for load in loaders))
+
+
+EXPORT_COLUMNS = (
+    ('Артикул', lambda p: p.article),
+    ('Товар', lambda p: p.product),
+    ('Категория', lambda p: p.category.name),
+    ('Производитель', lambda p: p.manufacturer.name),
+    ('Поставщик', lambda p: p.producer.name),
+    ('Единица измерения', lambda p: p.unit),
+    ('Цена', lambda p: p.price),
+    ('Скидка', lambda p: p.discount),
+    ('Цена со скидкой', lambda p: p.final_price),
+    ('Количество на складе', lambda p: p.amount_on_warehouse),
+    ('Описание', lambda p: p.description),
+)
+
+
+class Echo:
+    # Объект с интерфейсом файла для csv.writer: строка сразу отдается в ответ
+    def write(self, value):
+        return value
+
+
+def iter_export_rows(filters):
+    products = filter_products(filters).order_by(*get_ordering(filters))
+    tables = dimension_cache.tables(Producer, Manufacturer, CategoryProduct)
+    for product in products.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        attach_dimensions([product], tables)
+        yield [get_value(product) for _, get_value in EXPORT_COLUMNS]
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow([title for title, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_json(rows):
+    titles = [title for title, _ in EXPORT_COLUMNS]
+    yield '['
+    for i, row in enumerate(rows):
+        item = json.dumps(dict(zip(titles, row)), ensure_ascii=False, cls=DjangoJSONEncoder)
+        yield item if i == 0 else ',\n' + item
+    yield ']'
+
+
+@login_required
+def export_products(request):
+    # Выгрузка результата фильтров manager/admin потоком, без загрузки
+    # всего каталога в память
+    rows = iter_export_rows(get_filter_params(request))
+    if request.GET.get('format') == 'json':
+        response = StreamingHttpResponse(stream_json(rows), content_type='application/json; charset=utf-8')
+        filename = 'products.json'
+    else:
+        response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv; charset=utf-8')
+        filename = 'products.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 def upload_product_image(request, product_id):
     if request.method == 'POST' and request.FILES.get('image'):
         product = get_object_or_404(Product, id=product_id)
         product.image = request.FILES['image']
         product.save()
+        # Миниатюры генерируются в пуле процессов после фиксации транзакции
+        transaction.on_commit(lambda: schedule_derivatives(product.image.name, product.image.storage))
     return redirect('admin')
 
 
 
+def check_metrics_access(request):
+    if request.user.is_staff or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return (bool(settings.METRICS_TOKEN) and scheme.lower() == 'bearer'
+            and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()))
+
+
+def metrics_view(request):
+    # Метрики в текстовом формате Prometheus
+    if not check_metrics_access(request):
+        raise PermissionDenied("Доступ запрещен")
+    stats = listing_cache.stats()
+    body = ''.join((
+        registry.render(),
+        render_value('exam_listing_cache_hits_total', 'counter', 'Попадания в кэш списков', stats['hits']),
+        render_value('exam_listing_cache_misses_total', 'counter', 'Промахи кэша списков', stats['misses']),
+        render_value('exam_listing_cache_entries', 'gauge', 'Записей в кэше списков', stats['size']),
+    ))
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# Холодные кэши: сессия, пользователь, группы и построение индекса
+@query_budget(4)
+@replica_reads
+@conditional_catalog(csrf=False, get_version=product_index_version)
 def search_view(request):
-    search_query = request.GET.get('search', '')
-    if search_query:
-        results = Product.objects.filter(product__icontains=search_query).values('id', 'product]')[:10]
-        data = list(results)
-    else:
-        data = []
+    # Автодополнение отвечает из индекса в памяти и не обращается к БД
+    search_query = request.GET.get('q', request.GET.get('search', ''))
+    data = get_product_index().search(search_query, settings.AUTOCOMPLETE_LIMIT)
     return JsonResponse(data, safe=False)
 
-def handle_welcome_message(request):
-    if request.session.get('show_welcome_message'):
-        username = request.session.get('username', '')
-        messages.success(request, f"Добро пожаловать, {username}!")
-        del request.session['show_welcome_message']
-        if 'username' in request.session:
-            del request.session['username']
-
+@query_budget(6)
+@replica_reads
 @login_required
+@conditional_catalog
 def manager(request):
-    handle_welcome_message(request)
     context = get_filtered_products(request)
     return render(request, "manager.html", context)
 
+@query_budget(6)
+@replica_reads
 @login_required
+@conditional_catalog
 def admin(request):
-    handle_welcome_message(request)
     context = get_filtered_products(request)
     return render(request, "admin.html", context)
 
+def check_staff_access(request):
+    if not (check_group_access(request.user, "Менеджер") or check_group_access(request.user, "Администратор")):
+        messages.error(request,
+                       "У вас нет доступа к этой странице. "
+                       "Требуется роль 'Менеджер' или 'Администратор'.")
+        raise PermissionDenied("Доступ запрещен")
+
+
+@query_budget(6)
+@login_required
+def orders_dashboard(request):
+    check_staff_access(request)
+    # Страница читает только сводные таблицы, без GROUP BY по заказам
+    context = {
+        'by_status': OrderStatusSummary.objects.select_related('status').filter(orders__gt=0).order_by('-orders'),
+        'by_pvz': OrderPvzSummary.objects.select_related('pvz').filter(orders__gt=0).order_by('-orders'),
+        'by_date': OrderDeliverySummary.objects.filter(orders__gt=0)
+                   .order_by('-date_delivery')[:settings.ORDERS_DASHBOARD_DAYS],
+    }
+    return render(request, "orders_dashboard.html", context)
+
+
+def serialize_order(order):
+    return {
+        'id': order.id,
+        'number_order': order.number_order,
+        'code': order.code,
+        'article': order.arcticle,
+        'amount': order.amount_product,
+        'date_delivery': order.date_delivery,
+        'client': order.client.get_full_name() or order.client.username,
+        'status': order.status.name,
+    }
+
+
+def get_pvz_or_404(pvz_id):
+    pvz = dimension_cache.table(Pvz).get(pvz_id)
+    if pvz is None:
+        raise Http404("Пункт выдачи не найден")
+    return pvz
+
+
+@query_budget(5)
+@login_required
+def pvz_order_lookup(request, pvz_id):
+    # Заказы пункта выдачи по коду получения (?code=, можно несколько)
+    check_staff_access(request)
+    get_pvz_or_404(pvz_id)
+    codes, _ = parse_codes(request.GET.getlist('code')[:settings.PICKUP_BATCH_LIMIT])
+    return JsonResponse([serialize_order(order) for order in pvz_orders(pvz_id, codes)], safe=False)
+
+
+# Число запросов не зависит от числа кодов: выборка, один UPDATE и по
+# изменению (с точками сохранения) на каждый затронутый статус в сводной таблице
+@query_budget(20)
+@login_required
+@require_POST
+def pvz_issue_orders(request, pvz_id):
+    """
+    Выдача пачки заказов по кодам получения: коды передаются полями
+    code формы или списком codes в JSON.
+    """
+    check_staff_access(request)
+    get_pvz_or_404(pvz_id)
+    if request.content_type == 'application/json':
+        try:
+            codes = json.loads(request.body).get('codes', [])
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'Некорректный JSON'}, status=400)
+    else:
+        codes = request.POST.getlist('code')
+    if not isinstance(codes, list) or len(codes) > settings.PICKUP_BATCH_LIMIT:
+        return JsonResponse({'error': f'Нужен список не более чем из {settings.PICKUP_BATCH_LIMIT} кодов'},
+                            status=400)
+    result = issue_orders(pvz_id, codes)
+    logger.info(f"Пункт выдачи {pvz_id}: выдано заказов {len(result['issued'])}")
+    return JsonResponse({
+        'issued': [serialize_order(order) for order in result['issued']],
+        'already_issued': [serialize_order(order) for order in result['already_issued']],
+        'not_found': result['not_found'],
+    })
+
 def login_view(request):
-    if request.session.get('show_logout_message'):
-        username = request.session.get('username', '')
-        if username:
-            messages.info(request, f"До свидания, {username}! Вы успешно вышли из системы.")
-        else:
-            messages.info(request, "Вы успешно вышли из системы.")
-        del request.session['show_logout_message']
-        if 'username' in request.session:
-            del request.session['username']
     if request.method == "POST":
         username = request.POST.get('username')
         password = request.POST.get('password')
@@ -153,16 +452,13 @@ def login_view(request):
 
         if user is not None:
             login(request, user)
-            request.session['show_welcome_message'] = True
-            request.session['username'] = user.get_full_name() or user.username
+            # Приветствие живет в cookie сообщений и не пишет в сессию
+            messages.success(request, f"Добро пожаловать, {user.get_full_name() or user.username}!")
             logger.info(f"Пользователь {username} успешно вошел в систему")
             # Проверяется в какой группе состоит пользователь и если он есть переходит на свою страницу
-            if check_group_access(user, "Администратор"):
-                return redirect('admin')
-            elif check_group_access(user, "Авторизованный клиент"):
-                return redirect('client')
-            elif check_group_access(user, "Менеджер"):
-                return redirect('manager')
+            role = get_user_role(user)
+            if role is not None:
+                return redirect(role)
             else:
                 messages.warning(request,
                                  "У вашей учетной записи не назначено ни одной роли. "
@@ -176,10 +472,13 @@ def login_view(request):
     return render(request, "login.html")
 
 def logout_view(request):
+    username = ''
     if request.user.is_authenticated:
         username = request.user.get_full_name() or request.user.username
-        request.session['show_logout_message'] = True
-        request.session['username'] = username
         logger.info(f"Пользователь {username} вышел из системы")
     logout(request)
+    if username:
+        messages.info(request, f"До свидания, {username}! Вы успешно вышли из системы.")
+    else:
+        messages.info(request, "Вы успешно вышли из системы.")
     return redirect("/")
\ No newline at end of file